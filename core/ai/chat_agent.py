@@ -27,12 +27,15 @@ class SnowballAI:
 
     def __init__(self, logger=None):
         self.logger = logger or SnowballLogger()
-        self.sentiment_analysis = SentimentAnalysis(logger=self.logger)
+        self.memory = Memory.shared(logger=self.logger, write_behind=True)
+        self.memory.start_file_monitoring()
+        self.memory.start_embedding_job()
+        self.memory.start_backup_job()
+        self.sentiment_analysis = SentimentAnalysis(logger=self.logger, memory=self.memory)
         self.decision_maker = DecisionMaker(self.logger, sentiment_analyzer=self.sentiment_analysis)
         self.api_keys = self._load_api_keys()
         if not self.api_keys:
             self.logger.log_error("Error loading API keys: API keys are missing or invalid.")
-        self.memory = Memory(logger=self.logger)
         self.metadata_cache = TTLCache(maxsize=500, ttl=300)
         self.response_cache = TTLCache(maxsize=500, ttl=300)
         self.personality = "helpful"
@@ -79,7 +82,7 @@ class SnowballAI:
 
             # Format prompt with system message
             system_message = self.get_system_message(sentiment)
-            self.memory.store_interaction("system_message", system_message)
+            self.memory.store_interaction("system_message", system_message, intern=True)
             formatted_prompt = self.format_prompt(user_input)
 
             # Query models and get responses
@@ -89,14 +92,17 @@ class SnowballAI:
                 grok_response = self.query_with_cache(self.query_grok, formatted_prompt)
 
             # Decide on the best response
+            responses = {"GPT-4": gpt_response, "Grok": grok_response}
             best_response = self.decision_maker.select_best_response(
-                {"GPT-4": gpt_response, "Grok": grok_response},
+                responses,
                 user_input,
                 query_type=query_type,
             )
+            chosen_model = next((model for model, response in responses.items()
+                                 if response and response == best_response), None)
 
             # Store interaction in memory
-            self.memory.store_interaction(user_input, best_response, query_type)
+            self.memory.store_interaction(user_input, best_response, query_type, model=chosen_model)
 
             # Log output to interaction log
             self.logger.log_interaction(user_input, best_response)
@@ -145,9 +151,16 @@ class SnowballAI:
         """Standardize prompt formatting with dynamic context."""
         last_interaction = self.memory.get_last_interaction()
         context = f"Previous interaction: {last_interaction[1]}" if last_interaction else "No prior context available."
+        recalled = self.memory.recall(user_input, k=3)
+        if recalled:
+            context += "\nRelevant past interactions:\n" + "\n".join(
+                f"- User: {interaction[1]} | Snowball: {interaction[2]}" for interaction in recalled
+            )
 
-        # Fetch user preferences dynamically
-        user_preferences = self.memory.get_user_preferences() or "No specific preferences provided."
+        # Served from Memory's in-process mirror, so this adds no database round trip per turn.
+        preferences = self.memory.get_user_preferences()
+        user_preferences = "; ".join(f"{key}: {value}" for key, value in sorted(preferences.items())) \
+            or "No specific preferences provided."
 
         return (
             "You are Snowball, a singular, evolving artificial intelligence designed to act as both a personal assistant "
@@ -224,11 +237,11 @@ class SnowballAI:
             return None
 
     def save_conversation_history(self, file_path):
-        """Save the conversation history to a file."""
+        """Save the conversation history to a JSON Lines file."""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.memory.get_all_interactions(), f, indent=2)
-            self.logger.log_event("Conversation history saved successfully.")
+            self.memory.flush()
+            count = self.memory.export_interactions_jsonl(file_path)
+            self.logger.log_event(f"Conversation history saved successfully ({count} interactions).")
         except Exception as e:
             self.logger.log_error(f"Error saving conversation history: {e}")
 
@@ -294,17 +307,19 @@ class SnowballAI:
             return best_response
     
     def load_conversation_history(self, file_path):
-        """Load conversation history from a file."""
+        """Load conversation history from a JSON Lines file."""
         try:
             if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    interactions = json.load(f)
-                    for interaction in interactions:
-                        self.memory.store_interaction(interaction['role'], interaction['content'])
-                self.logger.log_event("Conversation history loaded successfully.")
+                count = self.memory.import_interactions_jsonl(file_path)
+                self.logger.log_event(f"Conversation history loaded successfully ({count} interactions).")
         except Exception as e:
             self.logger.log_error(f"Error loading conversation history: {e}")
 
+    def shutdown(self):
+        """Release the shared memory service."""
+        self.memory.release()
+        self.logger.log_event("Snowball AI shut down.")
+
     def reset_conversation_context(self):
         """Reset the conversation memory to clear the context."""
         self.memory.reset()
@@ -1,54 +1,456 @@
 import sqlite3
 import os
+import re
 import threading
+import sys
+import time
+import queue
+import zlib
+import hashlib
+import json
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from cachetools import LRUCache
 from contextlib import contextmanager
-from Snowball.core.system.file_manager import FileManager
+from Snowball.core.ai.vector_store import VectorStore, EMBEDDING_MODEL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Applied to every connection. WAL lets readers run alongside the single writer.
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -65536,         # 64 MB page cache per connection
+    "mmap_size": 268435456,       # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+}
+
+# Missing tags (None) leave the stored values untouched. Analysis text is not part
+# of the upsert; it goes to analysis_blobs through _set_file_analysis.
+UPSERT_FILE_METADATA = """
+    INSERT INTO file_metadata (name, path, last_modified, file_size, tags)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        last_modified = excluded.last_modified,
+        file_size = excluded.file_size,
+        tags = COALESCE(excluded.tags, file_metadata.tags)
+"""
+
+# Directory part of file_metadata.path, trailing separator included. rtrim drops trailing
+# characters that occur anywhere in the path other than '/' and '\', so it stops at the last separator.
+FILE_DIRECTORY = "rtrim(path, replace(replace(path, '/', ''), '\\', ''))"
 
 class MemoryError(Exception):
     pass
 
+class _FlushRequest(threading.Event):
+    """Barrier queued behind pending write-behind rows; set once they are committed."""
+
+    def __init__(self, durable=False):
+        super().__init__()
+        self.durable = durable
+
+_STOP_WRITER = object()
+
+INTERACTION_COLUMNS = "id, user_input, ai_response, query_type, timestamp"
+# Physical layout of live and archived rows; interned payloads are kept as ids.
+STORED_INTERACTION_COLUMNS = f"{INTERACTION_COLUMNS}, user_input_id, ai_response_id"
+
+# Rollup key for a stored interaction row; rows with unparseable timestamps count towards today.
+ROLLUP_DAY = "COALESCE(date({timestamp}), date('now'))"
+
+INSERT_INTERACTION = """
+    INSERT INTO interactions (user_input, ai_response, query_type, timestamp, user_input_id, ai_response_id)
+    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+"""
+
+class QueryCache:
+    """LRU cache of query results tagged with the generation of the tables they read.
+
+    Writers call invalidate(table) after committing, which bumps that table's
+    generation; entries cached under an older generation are treated as misses.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (generations, value, size)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def generations(self, tables):
+        """Snapshot the generations of tables; take it before running the query."""
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key, tables, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] != tuple(self._generations.get(table, 0) for table in tables):
+                self._remove(key)
+                self.stale += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generations, value):
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (generations, value, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key):
+        self.size_bytes -= self._entries.pop(key)[2]
+
+    @staticmethod
+    def _estimate_size(value):
+        """Approximate memory held by a list of result rows."""
+        size = sys.getsizeof(value)
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, tuple):
+                size += sum(sys.getsizeof(field) for field in row)
+        return size
+
+class QueryStats:
+    """Latency histograms per Memory method, writer lock wait times and a slow-statement log."""
+
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+    def __init__(self, recent_slow=20):
+        self._lock = threading.Lock()
+        self.methods = {}
+        self.lock_acquisitions = 0
+        self.lock_contended = 0
+        self.lock_wait_total = 0.0
+        self.lock_wait_max = 0.0
+        self.slow_queries = 0
+        self.recent_slow = deque(maxlen=recent_slow)
+
+    def record_call(self, method, seconds):
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            entry = self.methods.get(method)
+            if entry is None:
+                entry = self.methods[method] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                "buckets": [0] * len(self.BUCKETS_MS)}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["buckets"][next(i for i, bound in enumerate(self.BUCKETS_MS) if elapsed_ms <= bound)] += 1
+
+    def record_lock_wait(self, seconds):
+        with self._lock:
+            self.lock_acquisitions += 1
+            self.lock_wait_total += seconds
+            self.lock_wait_max = max(self.lock_wait_max, seconds)
+            if seconds > 0.001:
+                self.lock_contended += 1
+
+    def record_slow_query(self, method, sql, seconds, plan):
+        with self._lock:
+            self.slow_queries += 1
+            self.recent_slow.append({"method": method, "sql": sql, "ms": seconds * 1000, "plan": plan})
+
+    def snapshot(self):
+        with self._lock:
+            methods = {}
+            for method, entry in self.methods.items():
+                methods[method] = {
+                    "count": entry["count"],
+                    "avg_ms": entry["total_ms"] / entry["count"],
+                    "max_ms": entry["max_ms"],
+                    "histogram": {f"<={bound}ms": count for bound, count in zip(self.BUCKETS_MS, entry["buckets"]) if count},
+                }
+            return {
+                "methods": methods,
+                "lock": {
+                    "acquisitions": self.lock_acquisitions,
+                    "contended": self.lock_contended,
+                    "wait_total_ms": self.lock_wait_total * 1000,
+                    "wait_max_ms": self.lock_wait_max * 1000,
+                },
+                "slow_queries": self.slow_queries,
+                "recent_slow_queries": list(self.recent_slow),
+            }
+
+class _TimedCursor:
+    """Cursor proxy that times each statement and reports slow ones to Memory."""
+
+    def __init__(self, cursor, memory, method):
+        self._cursor = cursor
+        self._memory = memory
+        self._method = method
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        result = self._cursor.execute(sql, params)
+        self._memory._check_slow_query(self._cursor, self._method, sql, params, time.perf_counter() - start)
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        result = self._cursor.executemany(sql, seq_of_params)
+        self._memory._check_slow_query(self._cursor, self._method, sql, None, time.perf_counter() - start)
+        return result
+
+DEFAULT_DB_PATH = 'S:/Snowball/storage/data/memories.db'
+
 class Memory:
-    def __init__(self, db_path='S:/Snowball/storage/data/memories.db', logger=None):
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, logger=None, metadata_batch_size=1000,
+                 write_behind=False, commit_rows=100, commit_interval_ms=50, query_cache_bytes=64 * 1024 * 1024,
+                 archive_path=None, slow_query_ms=100, max_readers=8):
         self.logger = logger
+        self.slow_query_ms = slow_query_ms
+        self.query_stats = QueryStats()
         self.db_path = db_path
+        self.archive_path = archive_path or f"{os.path.splitext(db_path)[0]}_archive.db"
+        self._archive_generation = 0
+        self.metadata_batch_size = metadata_batch_size
+        self.write_behind = write_behind
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval_ms / 1000.0
+        self._write_queue = queue.Queue()
+        self._writer_thread = None
+        self.vector_store = VectorStore(f"{os.path.splitext(db_path)[0]}_embeddings", logger=self.logger)
+        self._embedding_model = None
+        self._embedded_through = 0
+        self._embedding_lock = threading.Lock()
+        self._embedding_stop = threading.Event()
+        self._embedding_thread = None
+        self._backup_stop = threading.Event()
+        self._backup_thread = None
         self.cache = LRUCache(maxsize=1000)
-        self.metadata_cache = LRUCache(maxsize=500)
+        self.metadata_cache = QueryCache(max_bytes=query_cache_bytes)
         self._db_lock = threading.Lock()
+        # Read-only connections are pooled rather than kept per thread, so short-lived worker
+        # threads (scan walkers, executors) borrow one and never leave it open behind them.
+        self.max_readers = max_readers
+        self._idle_readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
         self.scan_dir = 'S:/'
+        self.file_manager = None
+        self._refcount = 0
+        self._preferences = {}
+        self._preferences_lock = threading.Lock()
+        self._preference_listeners = []
 
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
 
         try:
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._configure_connection(self.conn)
+            self.conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            self.conn.execute("PRAGMA archive.journal_mode=WAL")
             if self.logger:
                 self.logger.log_memory("Initialize", f"Connected to SQLite database: {self.db_path}")
             self.create_tables()
+            with self._get_cursor() as cursor:
+                self._upgrade_archive_partitions(cursor)
+                self._refresh_interaction_view(cursor)
+                self._create_rollup_tables(cursor)
+            self.refresh_user_preferences()
         except sqlite3.Error as e:
             if self.logger:
                 self.logger.log_error(f"Error connecting to SQLite database: {e}")
             raise MemoryError(f"Error connecting to SQLite database: {e}")
 
-        # Initialize FileManager
+        if self.write_behind:
+            self._writer_thread = threading.Thread(target=self._write_behind_loop, daemon=True)
+            self._writer_thread.start()
+
+    @classmethod
+    def shared(cls, db_path=DEFAULT_DB_PATH, logger=None, **options):
+        """Return the process-wide Memory for db_path, creating it on first use.
+
+        Every call takes a reference that must be given back with release(). Options
+        only apply when the instance is created.
+        """
+        key = os.path.abspath(db_path)
+        with cls._shared_lock:
+            memory = cls._shared.get(key)
+            if memory is None:
+                memory = cls(db_path=db_path, logger=logger, **options)
+                cls._shared[key] = memory
+            memory._refcount += 1
+            return memory
+
+    def release(self):
+        """Drop a reference taken with shared(); the last one closes the database."""
+        with Memory._shared_lock:
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+            if Memory._shared.get(os.path.abspath(self.db_path)) is self:
+                del Memory._shared[os.path.abspath(self.db_path)]
+        self.close()
+
+    def start_file_monitoring(self, scan_dir=None):
+        """Create the FileManager and start watching scan_dir for changes."""
+        if self.file_manager is not None:
+            return self.file_manager
+        # Imported here so Memory users that never index files don't load TensorFlow.
+        from Snowball.core.system.file_manager import FileManager
+        self.scan_dir = scan_dir or self.scan_dir
         self.file_manager = FileManager(logger=self.logger, memory=self, scan_dir=self.scan_dir)
         self.file_manager.start_monitoring()
+        return self.file_manager
 
     @contextmanager
     def _get_cursor(self):
         """Context manager to handle database connection and ensure thread safety."""
+        method = sys._getframe(2).f_code.co_name
+        start = time.perf_counter()
         with self._db_lock:
+            acquired = time.perf_counter()
+            self.query_stats.record_lock_wait(acquired - start)
             cursor = self.conn.cursor()
             try:
-                yield cursor
+                yield _TimedCursor(cursor, self, method)
                 self.conn.commit()
             except sqlite3.Error as e:
                 self.conn.rollback()
                 if self.logger:
                     self.logger.log_error(f"Database error: {e}")
                 raise MemoryError(f"Database operation failed: {e}")
+            except BaseException:
+                self.conn.rollback()
+                raise
             finally:
                 cursor.close()
+                self.query_stats.record_call(method, time.perf_counter() - acquired)
+
+    def _configure_connection(self, conn):
+        """Apply the shared performance PRAGMAs to a connection."""
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+
+    def _open_reader(self):
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._configure_connection(conn)
+        conn.execute("ATTACH DATABASE ? AS archive", (f"file:{os.path.abspath(self.archive_path)}?mode=ro",))
+        return conn
+
+    def _checkout_reader(self):
+        """Borrow an idle (connection, archive generation) pair, opening one while below max_readers."""
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_lock:
+            can_open = self._reader_count < self.max_readers
+            if can_open:
+                self._reader_count += 1
+        if not can_open:
+            return self._idle_readers.get()
+        try:
+            return self._open_reader(), None
+        except sqlite3.Error:
+            with self._reader_lock:
+                self._reader_count -= 1
+            raise
+
+    @contextmanager
+    def _get_read_cursor(self):
+        """Context manager for read-only queries that run concurrently with the writer."""
+        method = sys._getframe(2).f_code.co_name
+        start = time.perf_counter()
+        conn, generation = self._checkout_reader()
+        cursor = None
+        try:
+            if generation != self._archive_generation:
+                current = self._archive_generation
+                self._refresh_interaction_view(conn.cursor())
+                generation = current
+            cursor = conn.cursor()
+            yield _TimedCursor(cursor, self, method)
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.log_error(f"Database error: {e}")
+            raise MemoryError(f"Database operation failed: {e}")
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self._idle_readers.put((conn, generation))
+            self.query_stats.record_call(method, time.perf_counter() - start)
+
+    def _check_slow_query(self, cursor, method, sql, params, seconds):
+        """Log statements slower than slow_query_ms together with their query plan."""
+        if seconds * 1000 < self.slow_query_ms:
+            return
+        plan = None
+        if params is not None and sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            try:
+                plan_cursor = cursor.connection.cursor()
+                plan_cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = [row[3] for row in plan_cursor.fetchall()]
+                plan_cursor.close()
+            except sqlite3.Error:
+                pass
+        statement = " ".join(sql.split())
+        self.query_stats.record_slow_query(method, statement, seconds, plan)
+        if self.logger:
+            self.logger.log_warning(f"Slow query in Memory.{method} ({seconds * 1000:.1f} ms): {statement} | Plan: {plan}")
+
+    def stats(self):
+        """Snapshot of query latencies, lock contention, cache counters and queue depth."""
+        snapshot = self.query_stats.snapshot()
+        snapshot["query_cache"] = self.metadata_cache.stats()
+        snapshot["write_queue_depth"] = self._write_queue.qsize()
+        snapshot["embeddings"] = len(self.vector_store)
+        return snapshot
 
     def log_memory(self, action, details):
         """Log memory database changes."""
@@ -58,7 +460,7 @@ class Memory:
         try:
             with self._get_cursor() as cursor:
                 cursor.execute('''CREATE TABLE IF NOT EXISTS interactions (
-                                    id INTEGER PRIMARY KEY,
+                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
                                     user_input TEXT,
                                     ai_response TEXT,
                                     query_type TEXT,
@@ -75,47 +477,391 @@ class Memory:
                                     checksum TEXT,
                                     analysis_result TEXT
                                 )''')
+                self._add_missing_columns(cursor, "interactions", {"query_type": "TEXT", "user_input_id": "INTEGER",
+                                                                   "ai_response_id": "INTEGER"})
+                self._ensure_monotonic_interaction_ids(cursor)
+                self._add_missing_columns(cursor, "file_metadata", {"analysis_result": "TEXT", "analysis_blob_id": "INTEGER",
+                                                                     "mtime_ns": "INTEGER", "inode": "INTEGER",
+                                                                     "processed_at": "DATETIME"})
                 cursor.execute('''CREATE INDEX IF NOT EXISTS idx_file_metadata_name ON file_metadata (name)''')
                 cursor.execute('''CREATE INDEX IF NOT EXISTS idx_file_metadata_size ON file_metadata (file_size)''')
+                cursor.execute(f'''CREATE INDEX IF NOT EXISTS idx_file_metadata_directory ON file_metadata ({FILE_DIRECTORY})''')
+                cursor.execute('''CREATE TABLE IF NOT EXISTS directory_journal (
+                                    path TEXT PRIMARY KEY,
+                                    parent TEXT,
+                                    mtime_ns INTEGER,
+                                    child_count INTEGER,
+                                    scanned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                                ) WITHOUT ROWID''')
+                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_directory_journal_parent ON directory_journal (parent)''')
+                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_file_metadata_processed_checksum
+                                  ON file_metadata (checksum) WHERE processed_at IS NOT NULL''')
                 cursor.execute('''CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp)''')
+                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_interactions_type_time ON interactions (query_type, timestamp, id)''')
+                self._create_file_search_index(cursor)
+                self._create_file_tags_table(cursor)
+                self._create_analysis_blobs_table(cursor)
+                self._create_interned_strings_table(cursor)
+                cursor.execute('''CREATE TABLE IF NOT EXISTS user_preferences (
+                                    key TEXT PRIMARY KEY,
+                                    value TEXT NOT NULL,
+                                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                                ) WITHOUT ROWID''')
                 if self.logger:
                     self.logger.log_memory("Schema Update", "Created/checked tables and indexes.")
         except sqlite3.Error as e:
             if self.logger:
                 self.logger.log_error(f"Error creating tables: {e}")
 
-    def search_files_by_tags(self, tags):
-        """Search files by tags."""
+    def _ensure_monotonic_interaction_ids(self, cursor):
+        """Make sure interaction ids are never reused, even after archiving empties the live table.
+
+        Archived rows keep their ids, and recall and embedding look rows up by id, so the
+        live table is rebuilt with AUTOINCREMENT if it predates it, and its sequence is
+        raised past every id already in the archive.
+        """
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'interactions'")
+        if "AUTOINCREMENT" not in cursor.fetchone()[0].upper():
+            cursor.execute('''CREATE TABLE interactions_autoincrement (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                user_input TEXT,
+                                ai_response TEXT,
+                                query_type TEXT,
+                                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                user_input_id INTEGER,
+                                ai_response_id INTEGER
+                            )''')
+            cursor.execute(f"INSERT INTO interactions_autoincrement ({STORED_INTERACTION_COLUMNS}) "
+                           f"SELECT {STORED_INTERACTION_COLUMNS} FROM interactions")
+            cursor.execute("DROP TABLE interactions")
+            cursor.execute("ALTER TABLE interactions_autoincrement RENAME TO interactions")
+            if self.logger:
+                self.logger.log_memory("Schema Update", "Rebuilt interactions with AUTOINCREMENT ids.")
+
+        sources = ["main.interactions"] + [f"archive.{name}" for name in self._archive_partitions(cursor)]
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archived_interactions'")
+        if cursor.fetchone():
+            sources.append("main.archived_interactions")
+        cursor.execute(f"SELECT MAX(high) FROM ({' UNION ALL '.join(f'SELECT MAX(id) AS high FROM {source}' for source in sources)})")
+        high_water = cursor.fetchone()[0] or 0
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'interactions'", (high_water,))
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('interactions', ?)", (high_water,))
+
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add columns that older databases created before a schema change are missing."""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {info[1] for info in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                if self.logger:
+                    self.logger.log_memory("Schema Update", f"Added '{name}' column to {table}.")
+
+    def _create_file_search_index(self, cursor):
+        """Create the FTS5 index over file_metadata and the triggers that keep it in sync."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_search'")
+        exists = cursor.fetchone() is not None
+
+        # External-content table: the text lives in file_metadata, FTS5 only stores the index.
+        cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5(
+                            name, path, tags, analysis_result,
+                            content='file_metadata', content_rowid='id',
+                            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                        )''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS file_metadata_search_ai AFTER INSERT ON file_metadata BEGIN
+                            INSERT INTO file_search (rowid, name, path, tags, analysis_result)
+                            VALUES (new.id, new.name, new.path, new.tags, new.analysis_result);
+                        END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS file_metadata_search_ad AFTER DELETE ON file_metadata BEGIN
+                            INSERT INTO file_search (file_search, rowid, name, path, tags, analysis_result)
+                            VALUES ('delete', old.id, old.name, old.path, old.tags, old.analysis_result);
+                        END''')
+        # Upserts assign every column, so only reindex rows whose indexed text really changed;
+        # databases created before the WHEN guard get the trigger replaced.
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'file_metadata_search_au'")
+        row = cursor.fetchone()
+        if row and "WHEN" not in row[0]:
+            cursor.execute("DROP TRIGGER file_metadata_search_au")
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS file_metadata_search_au
+                        AFTER UPDATE OF name, path, tags, analysis_result ON file_metadata
+                        WHEN old.name IS NOT new.name OR old.path IS NOT new.path
+                             OR old.tags IS NOT new.tags OR old.analysis_result IS NOT new.analysis_result
+                        BEGIN
+                            INSERT INTO file_search (file_search, rowid, name, path, tags, analysis_result)
+                            VALUES ('delete', old.id, old.name, old.path, old.tags, old.analysis_result);
+                            INSERT INTO file_search (rowid, name, path, tags, analysis_result)
+                            VALUES (new.id, new.name, new.path, new.tags, new.analysis_result);
+                        END''')
+
+        if not exists:
+            # Rank name matches above path, tag and content matches.
+            cursor.execute("INSERT INTO file_search (file_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 3.0, 1.0)')")
+            cursor.execute("INSERT INTO file_search (file_search) VALUES ('rebuild')")
+            if self.logger:
+                self.logger.log_memory("Schema Update", "Built full-text index for file_metadata.")
+
+    @staticmethod
+    def _fts_query(text, prefix=True):
+        """Turn free text into an FTS5 MATCH expression of quoted terms."""
+        terms = re.findall(r"\w+", text or "")
+        suffix = "*" if prefix else ""
+        return " ".join(f'"{term}"{suffix}' for term in terms)
+
+    def _create_file_tags_table(self, cursor):
+        """Create the normalized tag table and migrate existing tag strings into it once."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_tags'")
+        exists = cursor.fetchone() is not None
+
+        # (tag, file_id) primary key doubles as the covering index for tag lookups.
+        cursor.execute('''CREATE TABLE IF NOT EXISTS file_tags (
+                            file_id INTEGER NOT NULL,
+                            tag TEXT NOT NULL,
+                            PRIMARY KEY (tag, file_id)
+                        ) WITHOUT ROWID''')
+        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_file_tags_file ON file_tags (file_id, tag)''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS file_metadata_tags_ad AFTER DELETE ON file_metadata BEGIN
+                            DELETE FROM file_tags WHERE file_id = old.id;
+                        END''')
+
+        if not exists:
+            cursor.execute("SELECT id, tags FROM file_metadata WHERE tags IS NOT NULL AND tags != ''")
+            rows = [(file_id, tag) for file_id, tags in cursor.fetchall() for tag in self._split_tags(tags)]
+            cursor.executemany("INSERT OR IGNORE INTO file_tags (file_id, tag) VALUES (?, ?)", rows)
+            if self.logger:
+                self.logger.log_memory("Schema Update", f"Migrated {len(rows)} file tags into file_tags.")
+
+    @staticmethod
+    def _split_tags(tags):
+        """Split a comma or semicolon separated tag string into normalized tags."""
+        if not tags:
+            return []
+        return list(dict.fromkeys(tag.strip().lower() for tag in re.split(r"[,;]", tags) if tag.strip()))
+
+    def _sync_file_tags(self, cursor, file_path, tags):
+        """Mirror a file's tag string into file_tags."""
+        cursor.execute("SELECT id FROM file_metadata WHERE path = ?", (file_path,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        cursor.execute("DELETE FROM file_tags WHERE file_id = ?", (row[0],))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO file_tags (file_id, tag) VALUES (?, ?)",
+            [(row[0], tag) for tag in self._split_tags(tags)]
+        )
+
+    @staticmethod
+    def _tag_set_query(tags, match="any", exclude=None):
+        """Build a compound SELECT of file ids from per-tag index lookups."""
+        tags = [tag.strip().lower() for tag in tags if tag and tag.strip()]
+        exclude = [tag.strip().lower() for tag in exclude or [] if tag and tag.strip()]
+        if not tags:
+            return None, []
+        operator = " INTERSECT " if match == "all" else " UNION "
+        query = operator.join(["SELECT file_id FROM file_tags WHERE tag = ?"] * len(tags))
+        params = list(tags)
+        if exclude:
+            query = f"SELECT file_id FROM ({query}) EXCEPT SELECT file_id FROM file_tags WHERE tag IN ({', '.join('?' * len(exclude))})"
+            params.extend(exclude)
+        return query, params
+
+    def search_files_by_tags(self, tags, match="any", exclude=None, limit=50, offset=0):
+        """Search files by tags.
+
+        match="any" returns files with at least one of the tags, match="all" only files
+        carrying every tag. Files tagged with anything in exclude are left out.
+        """
         try:
-            tag_query = " OR ".join(["tags LIKE ?"] * len(tags))
-            params = [f"%{tag}%" for tag in tags]
-            with self._get_cursor() as cursor:
-                cursor.execute(f"SELECT * FROM file_metadata WHERE {tag_query}", params)
+            id_query, params = self._tag_set_query(tags, match, exclude)
+            if not id_query:
+                return []
+            cache_key = ("tags", id_query, tuple(params), limit, offset)
+            results = self.metadata_cache.get(cache_key, ("file_metadata",))
+            if results is not None:
+                return results
+            generations = self.metadata_cache.generations(("file_metadata",))
+            with self._get_read_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT * FROM file_metadata WHERE id IN ({id_query}) ORDER BY id LIMIT ? OFFSET ?",
+                    params + [limit, offset]
+                )
                 results = cursor.fetchall()
-            self.logger.log_memory(f"Retrieved {len(results)} files matching tags: {tags}")
+            self.metadata_cache.put(cache_key, generations, results)
+            if self.logger:
+                self.logger.log_memory("Search Files By Tags", f"Retrieved {len(results)} files matching tags: {tags}")
             return results
-        except sqlite3.Error as e:
-            self.logger.log_error(f"Error searching files by tags '{tags}': {e}")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error searching files by tags '{tags}': {e}")
             return []
 
-    def store_interaction(self, user_input, ai_response, query_type="General"):
-        """Store a user interaction in the database."""
+    def get_tag_counts(self, tags=None, match="all", exclude=None, limit=50):
+        """Count tags, optionally only over files matching a tag selection, for faceted browsing."""
+        try:
+            id_query, params = self._tag_set_query(tags or [], match, exclude)
+            query = "SELECT tag, COUNT(*) FROM file_tags"
+            if id_query:
+                query += f" WHERE file_id IN ({id_query})"
+            query += " GROUP BY tag ORDER BY COUNT(*) DESC, tag LIMIT ?"
+            with self._get_read_cursor() as cursor:
+                cursor.execute(query, params + [limit])
+                return cursor.fetchall()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error counting file tags: {e}")
+            return []
+
+    def store_interaction(self, user_input, ai_response, query_type="General", intern=False, model=None):
+        """Store a user interaction in the database.
+
+        model names the backend whose response was chosen; it is only counted in the
+        daily rollups (see get_model_choices).
+
+        Pass intern=True for payloads that repeat verbatim (system prompts, detected
+        emotions): the text is stored once in interned_strings and referenced by id.
+        In write-behind mode the row is queued and committed by the background writer;
+        call flush() when a following read must see it.
+        """
+        if self.write_behind:
+            timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+            self._write_queue.put((user_input, ai_response, query_type, timestamp, intern, model))
+            if self.logger:
+                self.logger.log_memory("Queue Interaction", f"User: '{user_input}', AI: '{ai_response}', Type: '{query_type}'")
+            return
         try:
             with self._get_cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO interactions (user_input, ai_response, query_type) VALUES (?, ?, ?)",
-                    (user_input, ai_response, query_type)
-                )
+                cursor.execute(INSERT_INTERACTION,
+                               self._interaction_row(cursor, user_input, ai_response, query_type, None, intern))
+                if model:
+                    self._record_model_choice(cursor, query_type, model, None)
             if self.logger:
                 self.logger.log_memory("Store Interaction", f"User: '{user_input}', AI: '{ai_response}', Type: '{query_type}'")
         except MemoryError as e:
             if self.logger:
                 self.logger.log_error(f"Error storing interaction: {e}")
-    
-    def get_interactions(self, query_type=None, start_time=None, end_time=None, limit=100, offset=0):
+
+    def _create_interned_strings_table(self, cursor):
+        """Create the table of interned interaction payloads, compacting existing duplicates once."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'interned_strings'")
+        exists = cursor.fetchone() is not None
+        cursor.execute('''CREATE TABLE IF NOT EXISTS interned_strings (
+                            id INTEGER PRIMARY KEY,
+                            text TEXT UNIQUE NOT NULL
+                        )''')
+        if not exists:
+            compacted = self._compact_interactions(cursor)
+            if self.logger:
+                self.logger.log_memory("Schema Update", f"Interned {compacted} repeated interaction payloads.")
+
+    def _intern(self, cursor, text):
+        cursor.execute("INSERT OR IGNORE INTO interned_strings (text) VALUES (?)", (text,))
+        cursor.execute("SELECT id FROM interned_strings WHERE text = ?", (text,))
+        return cursor.fetchone()[0]
+
+    def _interaction_row(self, cursor, user_input, ai_response, query_type, timestamp, intern=False):
+        """Parameters for INSERT_INTERACTION, swapping interned payloads for their ids."""
+        if not intern:
+            return (user_input, ai_response, query_type, timestamp, None, None)
+        user_input_id = self._intern(cursor, user_input) if user_input is not None else None
+        ai_response_id = self._intern(cursor, ai_response) if ai_response is not None else None
+        return (None, None, query_type, timestamp, user_input_id, ai_response_id)
+
+    def _compact_interactions(self, cursor, min_repeats=10):
+        # Set-based: one statement per step instead of one unindexed UPDATE per repeated value.
+        # Payloads interned earlier (or by the other column) are swapped for their ids as well.
+        for column in ("user_input", "ai_response"):
+            cursor.execute(
+                f"""INSERT OR IGNORE INTO interned_strings (text)
+                    SELECT {column} FROM interactions WHERE {column} IS NOT NULL
+                    GROUP BY {column} HAVING COUNT(*) >= ?""",
+                (min_repeats,)
+            )
+            cursor.execute(
+                f"""UPDATE interactions
+                    SET {column}_id = (SELECT id FROM interned_strings WHERE text = interactions.{column}),
+                        {column} = NULL
+                    WHERE {column} IN (SELECT text FROM interned_strings)"""
+            )
+        cursor.execute("SELECT COUNT(*) FROM interned_strings")
+        return cursor.fetchone()[0]
+
+    def compact_interactions(self, min_repeats=10):
+        """Intern every payload repeated at least min_repeats times. Run VACUUM afterwards to shrink the file."""
+        try:
+            with self._get_cursor() as cursor:
+                interned = self._compact_interactions(cursor, min_repeats)
+            if self.logger:
+                self.logger.log_memory("Compact Interactions", f"{interned} interned payloads after compaction.")
+            return interned
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error compacting interactions: {e}")
+            return 0
+
+    def _write_behind_loop(self):
+        """Commit queued interactions in groups of commit_rows or every commit_interval seconds."""
+        while True:
+            item = self._write_queue.get()
+            rows, barriers, stopping = [], [], False
+            deadline = time.monotonic() + self.commit_interval
+            while True:
+                if item is _STOP_WRITER:
+                    stopping = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    barriers.append(item)
+                    break
+                rows.append(item)
+                remaining = deadline - time.monotonic()
+                if len(rows) >= self.commit_rows or remaining <= 0:
+                    break
+                try:
+                    item = self._write_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            self._commit_queued_interactions(rows, durable=any(barrier.durable for barrier in barriers))
+            for barrier in barriers:
+                barrier.set()
+            if stopping:
+                return
+
+    def _commit_queued_interactions(self, rows, durable=False):
+        try:
+            if rows:
+                with self._get_cursor() as cursor:
+                    cursor.executemany(INSERT_INTERACTION, [self._interaction_row(cursor, *row[:5]) for row in rows])
+                    for _, _, query_type, timestamp, _, model in rows:
+                        if model:
+                            self._record_model_choice(cursor, query_type, model, timestamp)
+            if durable:
+                # With synchronous=NORMAL a checkpoint is what syncs the WAL to disk.
+                with self._get_cursor() as cursor:
+                    cursor.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error committing {len(rows)} queued interactions: {e}")
+
+    def flush(self, durable=False, timeout=None):
+        """Wait until every queued interaction is committed.
+
+        With durable=True the WAL is also checkpointed so the rows survive a power loss.
+        Returns False if the timeout expired first.
+        """
+        if not self.write_behind or self._writer_thread is None or not self._writer_thread.is_alive():
+            if durable:
+                self._commit_queued_interactions([], durable=True)
+            return True
+        barrier = _FlushRequest(durable)
+        self._write_queue.put(barrier)
+        return barrier.wait(timeout)
+
+    def get_interactions(self, query_type=None, start_time=None, end_time=None, limit=100, offset=0, include_archived=False):
         """Retrieve interactions with optional filters."""
         try:
-            query = "SELECT * FROM interactions WHERE 1=1"
+            if include_archived:
+                query = f"SELECT {INTERACTION_COLUMNS} FROM all_interactions WHERE 1=1"
+            else:
+                query = "SELECT * FROM interaction_log WHERE 1=1"
             params = []
             if query_type:
                 query += " AND query_type = ?"
@@ -129,7 +875,7 @@ class Memory:
             query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
             params.extend([limit, offset])
 
-            with self._get_cursor() as cursor:
+            with self._get_read_cursor() as cursor:
                 cursor.execute(query, params)
                 results = cursor.fetchall()
 
@@ -139,55 +885,816 @@ class Memory:
         except sqlite3.Error as e:
             self.logger.log_error(f"Error retrieving interactions: {e}")
             return []
-    
+
+    def iter_interactions(self, after_id=None, query_type=None, since=None, until=None, chunk_size=1000, descending=False,
+                          include_archived=False):
+        """Stream interactions in (timestamp, id) order, chunk_size rows per query.
+
+        Paging is keyset based, so walking deep into the history costs the same per
+        chunk as the first one. after_id resumes right after (or, descending, before)
+        that interaction. include_archived also walks the archive database. A database
+        error is logged and raised as MemoryError, so a consumer never mistakes a failed
+        read for the end of the history.
+        """
+        source = "all_interactions" if include_archived else "interaction_log"
+        comparison, order = ("<", "DESC") if descending else (">", "ASC")
+        filters, filter_params = [], []
+        if query_type:
+            filters.append("query_type = ?")
+            filter_params.append(query_type)
+        if since:
+            filters.append("timestamp >= ?")
+            filter_params.append(since)
+        if until:
+            filters.append("timestamp <= ?")
+            filter_params.append(until)
+
+        try:
+            position = None
+            if after_id is not None:
+                with self._get_read_cursor() as cursor:
+                    cursor.execute(f"SELECT timestamp, id FROM {source} WHERE id = ?", (after_id,))
+                    position = cursor.fetchone()
+                if position is None:
+                    if self.logger:
+                        self.logger.log_error(f"Cannot resume interactions after unknown id {after_id}.")
+                    return
+
+            while True:
+                conditions = list(filters)
+                params = list(filter_params)
+                if position is not None:
+                    conditions.append(f"(timestamp, id) {comparison} (?, ?)")
+                    params.extend(position)
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                with self._get_read_cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT {INTERACTION_COLUMNS} FROM {source} {where} ORDER BY timestamp {order}, id {order} LIMIT ?",
+                        params + [chunk_size]
+                    )
+                    rows = cursor.fetchall()
+                yield from rows
+                if len(rows) < chunk_size:
+                    return
+                position = (rows[-1][4], rows[-1][0])
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error streaming interactions: {e}")
+            raise
+
+    def export_interactions_jsonl(self, file_path, include_archived=True, progress=None, chunk_size=1000):
+        """Stream interactions to a JSON Lines file, one object per line. Returns the row count.
+
+        Rows are read in keyset chunks, so memory use stays flat however long the history is.
+        progress, if given, is called with the running count after every chunk. The file is
+        written next to file_path and moved into place at the end; if reading fails, the
+        partial file is removed, an existing export is left as it was and the error is raised.
+        """
+        exported = 0
+        partial_path = f"{file_path}.partial"
+        try:
+            with open(partial_path, 'w', encoding='utf-8') as f:
+                for row in self.iter_interactions(include_archived=include_archived, chunk_size=chunk_size):
+                    f.write(json.dumps(dict(zip(INTERACTION_COLUMNS.split(", "), row)), ensure_ascii=False))
+                    f.write("\n")
+                    exported += 1
+                    if progress and exported % chunk_size == 0:
+                        progress(exported)
+            os.replace(partial_path, file_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        if progress:
+            progress(exported)
+        if self.logger:
+            self.logger.log_memory("Export Interactions", f"Exported {exported} interactions to {file_path}.")
+        return exported
+
+    def import_interactions_jsonl(self, file_path, batch_size=1000, progress=None):
+        """Load interactions from a JSON Lines file in batched transactions. Returns the row count.
+
+        Lines use the export format. A history saved by older versions, one JSON array of
+        {"role", "content"} objects, is recognised by its leading "[" and loaded whole, as it
+        was before; if it does not parse, json.JSONDecodeError is raised. Records that are
+        not JSON objects are skipped with a warning. Ids are reassigned; timestamps are kept
+        when present and a missing query_type is stored as "General", the same default
+        store_interaction uses. progress, if given, is called with the running count after
+        every committed batch.
+        """
+        imported = 0
+        batch = []
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for number, record in self._read_interaction_records(f, file_path):
+                    if not isinstance(record, dict):
+                        if self.logger:
+                            self.logger.log_warning(f"Skipping record {number} in {file_path}: not a JSON object")
+                        continue
+                    batch.append((
+                        record.get("user_input", record.get("role")),
+                        record.get("ai_response", record.get("content")),
+                        record.get("query_type") or "General",
+                        record.get("timestamp"),
+                    ))
+                    if len(batch) >= batch_size:
+                        imported += self._import_interaction_batch(batch)
+                        batch = []
+                        if progress:
+                            progress(imported)
+            if batch:
+                imported += self._import_interaction_batch(batch)
+                if progress:
+                    progress(imported)
+            if self.logger:
+                self.logger.log_memory("Import Interactions", f"Imported {imported} interactions from {file_path}.")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error importing interactions from {file_path} after {imported} rows: {e}")
+        return imported
+
+    def _read_interaction_records(self, f, file_path):
+        """Yield (line or array position, parsed record) pairs from an import file."""
+        if f.read(4096).lstrip()[:1] == "[":
+            f.seek(0)
+            yield from enumerate(json.load(f), 1)
+            return
+        f.seek(0)
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                if self.logger:
+                    self.logger.log_warning(f"Skipping malformed line {line_number} in {file_path}: {e}")
+
+    def _import_interaction_batch(self, batch):
+        with self._get_cursor() as cursor:
+            cursor.executemany(INSERT_INTERACTION, [row + (None, None) for row in batch])
+        return len(batch)
+
     def store_file_metadata(self, file_name, file_path, last_modified, file_size=None, tags=None, analysis_result=None):
         """Store or update file metadata in the database."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute(UPSERT_FILE_METADATA, (file_name, file_path, last_modified, file_size, tags))
+                if tags is not None:
+                    self._sync_file_tags(cursor, file_path, tags)
+                if analysis_result is not None:
+                    self._set_file_analysis(cursor, file_path, analysis_result)
+            self.metadata_cache.invalidate("file_metadata")
+            if self.logger:
+                self.logger.log_memory(
+                    "Store File Metadata", f"Stored metadata for file: {file_name}, Size: {file_size}, Tags: {tags}"
+                )
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error storing or updating file metadata: {e}")
+
+    def store_file_metadata_many(self, rows, batch_size=None):
+        """Store or update metadata for many files, one transaction per batch.
+
+        Each row is (file_name, file_path, last_modified[, file_size[, tags[, analysis_result]]]).
+        Returns the number of rows written.
+        """
+        batch_size = batch_size or self.metadata_batch_size
+        stored = 0
+        batch = []
+        try:
+            for row in rows:
+                batch.append(tuple(row) + (None,) * (6 - len(row)))
+                if len(batch) >= batch_size:
+                    stored += self._write_file_metadata_batch(batch)
+                    batch = []
+            if batch:
+                stored += self._write_file_metadata_batch(batch)
+            if self.logger:
+                self.logger.log_memory("Store File Metadata", f"Bulk stored metadata for {stored} files.")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error bulk storing file metadata after {stored} files: {e}")
+        return stored
+
+    def _write_file_metadata_batch(self, batch):
+        with self._get_cursor() as cursor:
+            cursor.executemany(UPSERT_FILE_METADATA, [row[:5] for row in batch])
+            for _, file_path, _, _, tags, analysis_result in batch:
+                if tags is not None:
+                    self._sync_file_tags(cursor, file_path, tags)
+                if analysis_result is not None:
+                    self._set_file_analysis(cursor, file_path, analysis_result)
+        self.metadata_cache.invalidate("file_metadata")
+        return len(batch)
+
+    def _create_analysis_blobs_table(self, cursor):
+        """Create the deduplicated, compressed store for extracted file text."""
+        cursor.execute('''CREATE TABLE IF NOT EXISTS analysis_blobs (
+                            id INTEGER PRIMARY KEY,
+                            checksum TEXT UNIQUE NOT NULL,
+                            codec TEXT NOT NULL,
+                            raw_size INTEGER,
+                            data BLOB
+                        )''')
+        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_file_metadata_blob ON file_metadata (analysis_blob_id)''')
+        # Contentless: the text is only stored once, compressed, in analysis_blobs.
+        cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS analysis_search USING fts5(
+                            text, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                        )''')
+
+        # Move text stored inline by older versions into blobs; the update trigger
+        # drops it from file_search as analysis_result is cleared.
+        migrated = 0
+        while True:
+            cursor.execute("SELECT id, analysis_result FROM file_metadata WHERE analysis_result IS NOT NULL LIMIT 500")
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for file_id, text in rows:
+                cursor.execute("UPDATE file_metadata SET analysis_blob_id = ?, analysis_result = NULL WHERE id = ?",
+                               (self._store_blob(cursor, text), file_id))
+            migrated += len(rows)
+        if migrated and self.logger:
+            self.logger.log_memory("Schema Update", f"Moved analysis text of {migrated} files into analysis_blobs.")
+
+    @staticmethod
+    def _compress(text):
+        data = text.encode("utf-8")
+        if zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=6).compress(data)
+        return "zlib", zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(codec, data):
+        if codec == "zstd":
+            if zstandard is None:
+                raise MemoryError("Analysis text is zstd-compressed but zstandard is not installed.")
+            return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+        return zlib.decompress(data).decode("utf-8")
+
+    def _store_blob(self, cursor, text):
+        """Return the id of the blob holding text, compressing and indexing it if it is new."""
+        checksum = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cursor.execute("SELECT id FROM analysis_blobs WHERE checksum = ?", (checksum,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        codec, data = self._compress(text)
+        cursor.execute("INSERT INTO analysis_blobs (checksum, codec, raw_size, data) VALUES (?, ?, ?, ?)",
+                       (checksum, codec, len(text), data))
+        blob_id = cursor.lastrowid
+        cursor.execute("INSERT INTO analysis_search (rowid, text) VALUES (?, ?)", (blob_id, text))
+        return blob_id
+
+    def _release_blobs(self, cursor, blob_ids):
+        """Delete the given blobs unless some file still refers to them. Returns the number removed."""
+        removed = 0
+        for blob_id in set(blob_ids) - {None}:
+            cursor.execute("SELECT 1 FROM file_metadata WHERE analysis_blob_id = ? LIMIT 1", (blob_id,))
+            if cursor.fetchone():
+                continue
+            cursor.execute("SELECT codec, data FROM analysis_blobs WHERE id = ?", (blob_id,))
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            # Contentless FTS5 needs the original text to remove a row.
+            cursor.execute("INSERT INTO analysis_search (analysis_search, rowid, text) VALUES ('delete', ?, ?)",
+                           (blob_id, self._decompress(*row)))
+            cursor.execute("DELETE FROM analysis_blobs WHERE id = ?", (blob_id,))
+            removed += 1
+        return removed
+
+    def _file_blob_ids(self, cursor, where, params):
+        cursor.execute(f"SELECT DISTINCT analysis_blob_id FROM file_metadata WHERE ({where}) AND analysis_blob_id IS NOT NULL",
+                       params)
+        return [blob_id for (blob_id,) in cursor.fetchall()]
+
+    def _set_file_analysis(self, cursor, file_path, analysis_text):
+        previous = self._file_blob_ids(cursor, "path = ?", (file_path,))
+        blob_id = self._store_blob(cursor, analysis_text) if analysis_text else None
+        cursor.execute(
+            """
+            INSERT INTO file_metadata (name, path, analysis_blob_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                analysis_blob_id = excluded.analysis_blob_id,
+                analysis_result = NULL
+            """,
+            (os.path.basename(file_path), file_path, blob_id)
+        )
+        self._release_blobs(cursor, [old for old in previous if old != blob_id])
+
+    def store_file_analysis(self, file_path, analysis_text):
+        """Store the text extracted from a file so it can be found by search_files.
+
+        Identical text is stored once, compressed, and shared by every file that has it.
+        """
+        try:
+            with self._get_cursor() as cursor:
+                self._set_file_analysis(cursor, file_path, analysis_text)
+            self.metadata_cache.invalidate("file_metadata")
+            if self.logger:
+                self.logger.log_memory("Store File Analysis", f"Stored {len(analysis_text or '')} characters for file: {file_path}")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error storing file analysis for '{file_path}': {e}")
+
+    def get_directory_journal(self, directory):
+        """Return (mtime_ns, child_count) recorded when directory was last listed, or None."""
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute("SELECT mtime_ns, child_count FROM directory_journal WHERE path = ?", (directory,))
+                return cursor.fetchone()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error reading directory journal for '{directory}': {e}")
+            return None
+
+    def get_journal_subdirectories(self, directory):
+        """Return the subdirectories of directory as of its last listing."""
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute("SELECT path FROM directory_journal WHERE parent = ?", (directory,))
+                return [path for (path,) in cursor.fetchall()]
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error reading directory journal for '{directory}': {e}")
+            return []
+
+    def store_directory_journal(self, rows):
+        """Upsert (path, parent, mtime_ns, child_count) rows for directories that were just listed."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.executemany(
+                    """INSERT INTO directory_journal (path, parent, mtime_ns, child_count) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(path) DO UPDATE SET
+                           parent = excluded.parent,
+                           mtime_ns = excluded.mtime_ns,
+                           child_count = excluded.child_count,
+                           scanned_at = CURRENT_TIMESTAMP""",
+                    rows
+                )
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error storing directory journal: {e}")
+
+    def list_directory_files(self, directory, recursive=False):
+        """Return (path, file_size, inode) for the indexed files inside directory.
+
+        Only files directly inside it unless recursive is set.
+        """
+        prefix = os.path.join(directory, "")
+        try:
+            with self._get_read_cursor() as cursor:
+                if recursive:
+                    cursor.execute("SELECT path, file_size, inode FROM file_metadata WHERE path >= ? AND path < ?",
+                                   (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+                else:
+                    cursor.execute(f"SELECT path, file_size, inode FROM file_metadata WHERE {FILE_DIRECTORY} = ?",
+                                   (prefix,))
+                return cursor.fetchall()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error listing indexed files in '{directory}': {e}")
+            return []
+
+    def delete_file_metadata(self, file_paths):
+        """Remove files that no longer exist. Returns the number of rows deleted."""
+        file_paths = list(file_paths)
+        try:
+            with self._get_cursor() as cursor:
+                blob_ids = []
+                for path in file_paths:
+                    blob_ids.extend(self._file_blob_ids(cursor, "path = ?", (path,)))
+                cursor.executemany("DELETE FROM file_metadata WHERE path = ?", [(path,) for path in file_paths])
+                deleted = cursor.rowcount
+                self._release_blobs(cursor, blob_ids)
+            self.metadata_cache.invalidate("file_metadata")
+            return deleted
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error deleting file metadata: {e}")
+            return 0
+
+    def delete_directory_tree(self, directories):
+        """Remove journal entries and indexed files at or below each directory. Returns files deleted."""
+        deleted = 0
+        try:
+            with self._get_cursor() as cursor:
+                for directory in directories:
+                    prefix = os.path.join(directory, "")
+                    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                    cursor.execute("DELETE FROM directory_journal WHERE path = ? OR (path >= ? AND path < ?)",
+                                   (directory, prefix, upper))
+                    blob_ids = self._file_blob_ids(cursor, "path >= ? AND path < ?", (prefix, upper))
+                    cursor.execute("DELETE FROM file_metadata WHERE path >= ? AND path < ?", (prefix, upper))
+                    deleted += cursor.rowcount
+                    self._release_blobs(cursor, blob_ids)
+            self.metadata_cache.invalidate("file_metadata")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error deleting directory trees: {e}")
+        return deleted
+
+    def move_file_metadata(self, old_path, new_path, last_modified=None):
+        """Carry a file's row (checksum, analysis, tags) over to the path it was renamed to."""
+        try:
+            with self._get_cursor() as cursor:
+                blob_ids = self._file_blob_ids(cursor, "path = ?", (new_path,))
+                cursor.execute("DELETE FROM file_metadata WHERE path = ?", (new_path,))
+                cursor.execute(
+                    "UPDATE file_metadata SET path = ?, name = ?, last_modified = COALESCE(?, last_modified) WHERE path = ?",
+                    (new_path, os.path.basename(new_path), last_modified, old_path)
+                )
+                self._release_blobs(cursor, blob_ids)
+            self.metadata_cache.invalidate("file_metadata")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error moving file metadata from '{old_path}' to '{new_path}': {e}")
+
+    def get_file_fingerprint(self, file_path):
+        """Return (file_size, mtime_ns, inode, checksum) recorded when the file was last hashed, or None."""
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute("SELECT file_size, mtime_ns, inode, checksum FROM file_metadata WHERE path = ?", (file_path,))
+                return cursor.fetchone()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error reading fingerprint for '{file_path}': {e}")
+            return None
+
+    def store_file_checksum(self, file_path, file_size, mtime_ns, inode, checksum):
+        """Record a file's checksum together with the stat fields it was computed from."""
         try:
             with self._get_cursor() as cursor:
                 cursor.execute(
                     """
-                    INSERT INTO file_metadata (name, path, last_modified, file_size, tags, analysis_result)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    INSERT INTO file_metadata (name, path, last_modified, file_size, mtime_ns, inode, checksum)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT(path) DO UPDATE SET
                         last_modified = excluded.last_modified,
                         file_size = excluded.file_size,
-                        tags = excluded.tags,
-                        analysis_result = excluded.analysis_result
+                        mtime_ns = excluded.mtime_ns,
+                        inode = excluded.inode,
+                        checksum = excluded.checksum,
+                        processed_at = CASE WHEN file_metadata.checksum IS excluded.checksum
+                                            THEN file_metadata.processed_at END
                     """,
-                    (file_name, file_path, last_modified, file_size, tags, analysis_result)
+                    (os.path.basename(file_path), file_path, datetime.fromtimestamp(mtime_ns / 1e9).isoformat(),
+                     file_size, mtime_ns, inode, checksum)
                 )
+            self.metadata_cache.invalidate("file_metadata")
+        except MemoryError as e:
             if self.logger:
-                self.logger.log_memory(
-                    f"Stored metadata for file: {file_name}, Size: {file_size}, Tags: {tags}"
+                self.logger.log_error(f"Error storing checksum for '{file_path}': {e}")
+
+    def mark_file_processed(self, file_path, checksum):
+        """Record that the content with this checksum has been analysed."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute(
+                    "UPDATE file_metadata SET processed_at = CURRENT_TIMESTAMP WHERE path = ? AND checksum = ?",
+                    (file_path, checksum)
                 )
-        except sqlite3.Error as e:
-            self.logger.log_error(f"Error storing or updating file metadata: {e}")
+            self.metadata_cache.invalidate("file_metadata")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error marking '{file_path}' as processed: {e}")
+
+    def copy_file_analysis(self, file_path, checksum):
+        """Give file_path the stored analysis of another file with the same checksum.
+
+        Identical content is analysed once; copies found later share its blob so they can be
+        found by search_files too. Returns True if an analysed file with that checksum exists.
+        """
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute(
+                    """SELECT analysis_blob_id, analysis_result, processed_at FROM file_metadata
+                       WHERE checksum = ? AND processed_at IS NOT NULL AND path != ?
+                       ORDER BY analysis_blob_id IS NULL LIMIT 1""",
+                    (checksum, file_path)
+                )
+                source = cursor.fetchone()
+                if source is None:
+                    return False
+                previous = self._file_blob_ids(cursor, "path = ?", (file_path,))
+                cursor.execute(
+                    """UPDATE file_metadata SET analysis_blob_id = ?, analysis_result = ?, processed_at = ?
+                       WHERE path = ? AND checksum = ?""",
+                    source + (file_path, checksum)
+                )
+                self._release_blobs(cursor, [old for old in previous if old != source[0]])
+            self.metadata_cache.invalidate("file_metadata")
+            return True
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error copying analysis to '{file_path}': {e}")
+            return False
+
+    def iter_processed_checksums(self, chunk_size=10000):
+        """Yield the distinct checksums of analysed files in sorted order, reading chunk_size at a time."""
+        last = ""
+        try:
+            while True:
+                with self._get_read_cursor() as cursor:
+                    cursor.execute(
+                        """SELECT DISTINCT checksum FROM file_metadata
+                           WHERE processed_at IS NOT NULL AND checksum > ?
+                           ORDER BY checksum LIMIT ?""",
+                        (last, chunk_size)
+                    )
+                    rows = cursor.fetchall()
+                for (checksum,) in rows:
+                    yield checksum
+                if len(rows) < chunk_size:
+                    return
+                last = rows[-1][0]
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error loading processed checksums: {e}")
+
+    def get_file_analysis(self, file_path):
+        """Return the stored analysis text for a file, decompressing it on demand."""
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT file_metadata.analysis_result, analysis_blobs.codec, analysis_blobs.data
+                    FROM file_metadata LEFT JOIN analysis_blobs ON analysis_blobs.id = file_metadata.analysis_blob_id
+                    WHERE file_metadata.path = ?
+                    """,
+                    (file_path,)
+                )
+                row = cursor.fetchone()
+            if not row:
+                return None
+            if row[2] is not None:
+                return self._decompress(row[1], row[2])
+            return row[0]
+        except (MemoryError, zlib.error) as e:
+            if self.logger:
+                self.logger.log_error(f"Error reading file analysis for '{file_path}': {e}")
+            return None
 
-    def search_files(self, keyword):
-        """Search indexed files by keyword with caching."""
-        if keyword in self.metadata_cache:
-            self.logger.log_memory(f"Cache hit for file search: '{keyword}'")
-            return self.metadata_cache[keyword]
+    def prune_analysis_blobs(self):
+        """Delete every blob no file refers to any more. Returns the number removed.
 
+        Writes that drop a file's reference release its blob as they go; this sweep
+        catches anything left over, and runs with each scheduled backup.
+        """
         try:
             with self._get_cursor() as cursor:
                 cursor.execute(
-                    "SELECT * FROM file_metadata WHERE name LIKE ? OR path LIKE ?",
-                    (f"%{keyword}%", f"%{keyword}%")
+                    """
+                    SELECT id FROM analysis_blobs
+                    WHERE NOT EXISTS (SELECT 1 FROM file_metadata WHERE analysis_blob_id = analysis_blobs.id)
+                    """
+                )
+                removed = self._release_blobs(cursor, [blob_id for (blob_id,) in cursor.fetchall()])
+            if self.logger:
+                self.logger.log_memory("Prune Analysis Blobs", f"Removed {removed} unreferenced blobs.")
+            return removed
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error pruning analysis blobs: {e}")
+            return 0
+
+    def search_files(self, keyword, limit=50, offset=0):
+        """Search indexed file names, paths, tags and contents by keyword, best matches first."""
+        cache_key = ("keyword", keyword, limit, offset)
+        results = self.metadata_cache.get(cache_key, ("file_metadata",))
+        if results is not None:
+            if self.logger:
+                self.logger.log_memory("Search Files", f"Cache hit for file search: '{keyword}'")
+            return results
+
+        match = self._fts_query(keyword)
+        if not match:
+            return []
+        try:
+            generations = self.metadata_cache.generations(("file_metadata",))
+            with self._get_read_cursor() as cursor:
+                # Content matches rank at half weight next to name, path and tag matches.
+                cursor.execute(
+                    """
+                    SELECT file_metadata.* FROM (
+                        SELECT rowid AS file_id, rank FROM file_search WHERE file_search MATCH ?
+                        UNION ALL
+                        SELECT file_metadata.id, analysis_search.rank * 0.5 FROM analysis_search
+                        JOIN file_metadata ON file_metadata.analysis_blob_id = analysis_search.rowid
+                        WHERE analysis_search MATCH ?
+                    ) AS hits
+                    JOIN file_metadata ON file_metadata.id = hits.file_id
+                    GROUP BY file_metadata.id
+                    ORDER BY MIN(hits.rank) LIMIT ? OFFSET ?
+                    """,
+                    (match, match, limit, offset)
                 )
                 results = cursor.fetchall()
-            self.metadata_cache[keyword] = results
-            self.logger.log_memory("Search Files", f"Retrieved {len(results)} files matching keyword: {keyword}")
+            self.metadata_cache.put(cache_key, generations, results)
+            if self.logger:
+                self.logger.log_memory("Search Files", f"Retrieved {len(results)} files matching keyword: {keyword}")
             return results
-        except sqlite3.Error as e:
-            self.logger.log_error(f"Error searching files by keyword '{keyword}': {e}")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error searching files by keyword '{keyword}': {e}")
             return []
         
+    def _create_rollup_tables(self, cursor):
+        """Create the per-day, per-query_type rollups, backfilling them from history on first run.
+
+        interaction_rollups is kept current by a trigger on interactions, so every insert
+        path (direct, write-behind, import) updates it. Archiving deletes live rows but
+        leaves the rollups alone. system_message rows are not counted.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'interaction_rollups'")
+        exists = cursor.fetchone() is not None
+        cursor.execute('''CREATE TABLE IF NOT EXISTS interaction_rollups (
+                            day TEXT NOT NULL,
+                            query_type TEXT NOT NULL,
+                            interactions INTEGER NOT NULL DEFAULT 0,
+                            responses INTEGER NOT NULL DEFAULT 0,
+                            response_chars INTEGER NOT NULL DEFAULT 0,
+                            PRIMARY KEY (day, query_type)
+                        ) WITHOUT ROWID''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS model_choice_rollups (
+                            day TEXT NOT NULL,
+                            query_type TEXT NOT NULL,
+                            model TEXT NOT NULL,
+                            choices INTEGER NOT NULL DEFAULT 0,
+                            PRIMARY KEY (day, query_type, model)
+                        ) WITHOUT ROWID''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS interactions_rollup AFTER INSERT ON interactions
+                          WHEN COALESCE(new.user_input, (SELECT text FROM interned_strings WHERE id = new.user_input_id))
+                               IS NOT 'system_message'
+                          BEGIN
+                            INSERT INTO interaction_rollups (day, query_type, interactions, responses, response_chars)
+                            SELECT {ROLLUP_DAY.format(timestamp="new.timestamp")}, COALESCE(new.query_type, 'General'), 1,
+                                   response IS NOT NULL, COALESCE(length(response), 0)
+                            FROM (SELECT COALESCE(new.ai_response,
+                                                  (SELECT text FROM interned_strings WHERE id = new.ai_response_id)) AS response)
+                            WHERE 1
+                            ON CONFLICT(day, query_type) DO UPDATE SET
+                                interactions = interactions + excluded.interactions,
+                                responses = responses + excluded.responses,
+                                response_chars = response_chars + excluded.response_chars;
+                          END''')
+        if not exists:
+            cursor.execute(f'''INSERT INTO interaction_rollups (day, query_type, interactions, responses, response_chars)
+                              SELECT {ROLLUP_DAY.format(timestamp="timestamp")} AS rollup_day,
+                                     COALESCE(query_type, 'General') AS rollup_type,
+                                     COUNT(*), COUNT(ai_response), COALESCE(SUM(length(ai_response)), 0)
+                              FROM all_interactions
+                              WHERE user_input IS NOT 'system_message'
+                              GROUP BY rollup_day, rollup_type''')
+            if self.logger:
+                self.logger.log_memory("Schema Update", f"Backfilled {cursor.rowcount} daily interaction rollups.")
+
+    def _record_model_choice(self, cursor, query_type, model, timestamp):
+        cursor.execute(
+            f"""INSERT INTO model_choice_rollups (day, query_type, model, choices)
+                VALUES ({ROLLUP_DAY.format(timestamp="?")}, COALESCE(?, 'General'), ?, 1)
+                ON CONFLICT(day, query_type, model) DO UPDATE SET choices = choices + 1""",
+            (timestamp, query_type, model)
+        )
+
+    def get_daily_rollups(self, start_day=None, end_day=None, query_type=None):
+        """Per-day interaction counts and average response length by query_type.
+
+        Reads the rollup table only, so the cost depends on the number of days asked
+        for, not on the size of the history. Days are 'YYYY-MM-DD' (UTC), inclusive.
+        Returns (day, query_type, interactions, avg_response_length) tuples, oldest first.
+        """
+        query = ("SELECT day, query_type, interactions, CAST(response_chars AS REAL) / MAX(responses, 1) "
+                 "FROM interaction_rollups WHERE 1=1")
+        params = []
+        if start_day:
+            query += " AND day >= ?"
+            params.append(start_day)
+        if end_day:
+            query += " AND day <= ?"
+            params.append(end_day)
+        if query_type:
+            query += " AND query_type = ?"
+            params.append(query_type)
+        query += " ORDER BY day, query_type"
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error retrieving interaction rollups: {e}")
+            return []
+
+    def get_model_choices(self, start_day=None, end_day=None, query_type=None):
+        """How often each model's response was chosen, per query_type, over an inclusive day range.
+
+        Returns (query_type, model, choices) tuples, most chosen first within each query_type.
+        """
+        query = "SELECT query_type, model, SUM(choices) FROM model_choice_rollups WHERE 1=1"
+        params = []
+        if start_day:
+            query += " AND day >= ?"
+            params.append(start_day)
+        if end_day:
+            query += " AND day <= ?"
+            params.append(end_day)
+        if query_type:
+            query += " AND query_type = ?"
+            params.append(query_type)
+        query += " GROUP BY query_type, model ORDER BY query_type, SUM(choices) DESC"
+        try:
+            with self._get_read_cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error retrieving model choice rollups: {e}")
+            return []
+
+    def get_user_preferences(self):
+        """Return all user preferences as a dict, served from the in-process mirror without touching SQLite."""
+        return dict(self._preferences)
+
+    def get_user_preference(self, key, default=None):
+        """Return one user preference from the in-process mirror."""
+        return self._preferences.get(key, default)
+
+    def set_user_preference(self, key, value):
+        """Persist a JSON-serializable preference value and update the mirror."""
+        self.set_user_preferences({key: value})
+
+    def set_user_preferences(self, preferences):
+        """Persist several preferences in one transaction and update the mirror."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.executemany(
+                    """INSERT INTO user_preferences (key, value) VALUES (?, ?)
+                       ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP""",
+                    [(key, json.dumps(value)) for key, value in preferences.items()]
+                )
+            self._apply_preference_changes(dict(preferences), [])
+            if self.logger:
+                self.logger.log_memory("Store Preferences", f"Updated preferences: {', '.join(preferences)}")
+        except (MemoryError, TypeError, ValueError) as e:
+            if self.logger:
+                self.logger.log_error(f"Error storing user preferences: {e}")
+
+    def delete_user_preference(self, key):
+        """Remove a preference from the database and the mirror."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute("DELETE FROM user_preferences WHERE key = ?", (key,))
+            self._apply_preference_changes({}, [key])
+            if self.logger:
+                self.logger.log_memory("Delete Preference", f"Removed preference: {key}")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error deleting user preference '{key}': {e}")
+
+    def refresh_user_preferences(self):
+        """Reload the mirror from SQLite, picking up changes written by other processes."""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute("SELECT key, value FROM user_preferences")
+                stored = {key: json.loads(value) for key, value in cursor.fetchall()}
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error loading user preferences: {e}")
+            return
+        current = self._preferences
+        changed = {key: value for key, value in stored.items() if key not in current or current[key] != value}
+        removed = [key for key in current if key not in stored]
+        if changed or removed:
+            self._apply_preference_changes(changed, removed)
+
+    def add_preference_listener(self, callback):
+        """Call callback(key, value) after each preference change; value is None when the key was removed."""
+        self._preference_listeners.append(callback)
+
+    def _apply_preference_changes(self, changed, removed):
+        # Readers never lock: they see either the old or the new dict, swapped in one assignment.
+        with self._preferences_lock:
+            preferences = dict(self._preferences)
+            preferences.update(changed)
+            for key in removed:
+                preferences.pop(key, None)
+            self._preferences = preferences
+        for callback in list(self._preference_listeners):
+            for key, value in list(changed.items()) + [(key, None) for key in removed]:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    if self.logger:
+                        self.logger.log_error(f"Error in preference listener for '{key}': {e}")
+
     def get_last_interaction(self):
         """Retrieve the last interaction."""
         try:
-            with self._get_cursor() as cursor:
-                cursor.execute("SELECT * FROM interactions ORDER BY id DESC LIMIT 1")
+            with self._get_read_cursor() as cursor:
+                cursor.execute("SELECT * FROM interaction_log ORDER BY id DESC LIMIT 1")
                 interaction = cursor.fetchone()
             if interaction and self.logger:
                 self.logger.log_memory("Retrieve Interaction", f"Retrieved last interaction: {interaction}")
@@ -196,26 +1703,323 @@ class Memory:
             if self.logger:
                 self.logger.log_error(f"Error retrieving last interaction: {e}")
 
-    def archive_old_interactions(self, days=30, archive_table="archived_interactions"):
-        """Archive old interactions instead of deleting them."""
+    @staticmethod
+    def _resolved_interactions(source):
+        """SELECT over a stored interactions table that swaps interned ids back for their text."""
+        return (
+            "SELECT i.id, COALESCE(i.user_input, u.text) AS user_input, COALESCE(i.ai_response, r.text) AS ai_response, "
+            f"i.query_type, i.timestamp FROM {source} AS i "
+            "LEFT JOIN main.interned_strings AS u ON u.id = i.user_input_id "
+            "LEFT JOIN main.interned_strings AS r ON r.id = i.ai_response_id"
+        )
+
+    def _archive_partitions(self, cursor):
+        cursor.execute(
+            "SELECT name FROM archive.sqlite_master WHERE type = 'table' AND name GLOB 'interactions_[0-9]*' ORDER BY name"
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+    def _upgrade_archive_partitions(self, cursor):
+        """Bring partitions archived by older versions up to date: interned payload columns and
+        the (timestamp, id) index keyset paging over all_interactions relies on."""
+        for name in self._archive_partitions(cursor):
+            cursor.execute(f"PRAGMA archive.table_info({name})")
+            existing = {info[1] for info in cursor.fetchall()}
+            for column in ("user_input_id", "ai_response_id"):
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE archive.{name} ADD COLUMN {column} INTEGER")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{name}_time ON {name} (timestamp, id)")
+
+    def _refresh_interaction_view(self, cursor):
+        """(Re)create the per-connection views that return interactions with full text.
+
+        interaction_log covers the live table, all_interactions live and archived rows.
+        """
+        selects = [self._resolved_interactions("main.interactions")]
+        selects += [self._resolved_interactions(f"archive.{name}") for name in self._archive_partitions(cursor)]
+        cursor.execute("DROP VIEW IF EXISTS temp.interaction_log")
+        cursor.execute(f"CREATE TEMP VIEW interaction_log AS {selects[0]}")
+        cursor.execute("DROP VIEW IF EXISTS temp.all_interactions")
+        cursor.execute(f"CREATE TEMP VIEW all_interactions AS {' UNION ALL '.join(selects)}")
+
+    @staticmethod
+    def _archive_partition(timestamp):
+        """Name of the monthly archive table for a timestamp, e.g. interactions_2024_05."""
+        match = re.match(r"(\d{4})-(\d{2})", str(timestamp or ""))
+        return f"interactions_{match.group(1)}_{match.group(2)}" if match else "interactions_0000_00"
+
+    def _archive_chunk(self, source_table, cutoff, chunk_size):
+        """Move one chunk of rows older than cutoff into their monthly archive tables."""
+        with self._get_cursor() as cursor:
+            cursor.execute(f"PRAGMA table_info({source_table})")
+            columns = {info[1] for info in cursor.fetchall()}
+            select = ", ".join(column if column in columns else f"NULL AS {column}"
+                               for column in STORED_INTERACTION_COLUMNS.split(", "))
+            cursor.execute(
+                f"SELECT {select} FROM main.{source_table} WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (cutoff, chunk_size)
+            )
+            rows = cursor.fetchall()
+
+            partitions = {}
+            for row in rows:
+                partitions.setdefault(self._archive_partition(row[4]), []).append(row)
+            cursor.execute("SELECT name FROM archive.sqlite_master WHERE type = 'table'")
+            existing = {name for (name,) in cursor.fetchall()}
+            created = False
+            for partition, partition_rows in partitions.items():
+                if partition not in existing:
+                    cursor.execute(f'''CREATE TABLE archive.{partition} (
+                                        id INTEGER PRIMARY KEY,
+                                        user_input TEXT,
+                                        ai_response TEXT,
+                                        query_type TEXT,
+                                        timestamp DATETIME,
+                                        user_input_id INTEGER,
+                                        ai_response_id INTEGER
+                                    )''')
+                    cursor.execute(f"CREATE INDEX archive.idx_{partition}_type_time ON {partition} (query_type, timestamp, id)")
+                    cursor.execute(f"CREATE INDEX archive.idx_{partition}_time ON {partition} (timestamp, id)")
+                    created = True
+                else:
+                    # A crash can commit the archive file but not the delete from main (WAL commits
+                    # across attached files are not atomic); rows copied by that run are skipped.
+                    # Any other id already present is a conflict and fails the chunk.
+                    placeholders = ", ".join("?" * len(partition_rows))
+                    cursor.execute(
+                        f"SELECT {STORED_INTERACTION_COLUMNS} FROM archive.{partition} WHERE id IN ({placeholders})",
+                        [row[0] for row in partition_rows]
+                    )
+                    already_archived = set(cursor.fetchall())
+                    partition_rows = [row for row in partition_rows if row not in already_archived]
+                cursor.executemany(
+                    f"INSERT INTO archive.{partition} ({STORED_INTERACTION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    partition_rows
+                )
+            cursor.executemany(f"DELETE FROM main.{source_table} WHERE id = ?", [(row[0],) for row in rows])
+            if created:
+                self._refresh_interaction_view(cursor)
+        if created:
+            # Bumped after commit so readers rebuilding their view see the new tables.
+            self._archive_generation += 1
+        return len(rows)
+
+    def archive_old_interactions(self, days=30, chunk_size=500, pause=0.05, legacy_table="archived_interactions"):
+        """Move interactions older than days into the monthly tables of the archive database.
+
+        Rows move chunk_size at a time, each chunk in its own short transaction, sleeping
+        pause seconds in between so other work can take the writer lock. Rows left in the
+        old in-database legacy_table are moved across as well.
+        """
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        rows_archived = 0
         try:
-            cutoff_date = datetime.now() - timedelta(days=days)
             with self._get_cursor() as cursor:
-                cursor.execute(f'''
-                    CREATE TABLE IF NOT EXISTS {archive_table} AS SELECT * FROM interactions WHERE 1=0
-                ''')
-                cursor.execute(f'''
-                    INSERT INTO {archive_table} SELECT * FROM interactions WHERE timestamp < ?
-                ''', (cutoff_date,))
-                cursor.execute("DELETE FROM interactions WHERE timestamp < ?", (cutoff_date,))
-                rows_archived = cursor.rowcount
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (legacy_table,))
+                sources = ["interactions", legacy_table] if cursor.fetchone() else ["interactions"]
+            for source in sources:
+                source_cutoff = cutoff if source == "interactions" else "9999-12-31"
+                while True:
+                    moved = self._archive_chunk(source, source_cutoff, chunk_size)
+                    rows_archived += moved
+                    if moved < chunk_size:
+                        break
+                    time.sleep(pause)
+                if source == legacy_table:
+                    with self._get_cursor() as cursor:
+                        cursor.execute(f"SELECT COUNT(*) FROM {legacy_table}")
+                        if cursor.fetchone()[0] == 0:
+                            cursor.execute(f"DROP TABLE {legacy_table}")
             if self.logger:
                 self.logger.log_memory("Archive Interactions", f"Archived {rows_archived} interactions older than {days} days.")
-        except sqlite3.Error as e:
-            self.logger.log_error(f"Error archiving old interactions: {e}")
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error archiving old interactions after {rows_archived} rows: {e}")
+        return rows_archived
+
+    def _load_embedding_model(self):
+        """Load the sentence embedding model on first use; None if it is unavailable."""
+        with self._embedding_lock:
+            if self._embedding_model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+                    if self.logger:
+                        self.logger.log_memory("Initialize", f"Loaded embedding model: {EMBEDDING_MODEL}")
+                except Exception as e:
+                    if self.logger:
+                        self.logger.log_error(f"Error loading embedding model '{EMBEDDING_MODEL}': {e}")
+                    self._embedding_model = False
+            return self._embedding_model or None
+
+    def embed_new_interactions(self, batch_size=256):
+        """Embed interactions stored since the last run. Returns the number embedded."""
+        model = self._load_embedding_model()
+        if model is None:
+            return 0
+        embedded = 0
+        try:
+            while True:
+                with self._get_read_cursor() as cursor:
+                    cursor.execute(
+                        "SELECT id, user_input, ai_response FROM all_interactions WHERE id > ? ORDER BY id LIMIT ?",
+                        (max(self._embedded_through, self.vector_store.last_id), batch_size)
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                self._embedded_through = rows[-1][0]
+                # System prompts repeat every turn and carry nothing worth recalling.
+                keep = [row for row in rows if row[1] != "system_message"]
+                if keep:
+                    texts = [f"{user_input or ''}\n{ai_response or ''}" for _, user_input, ai_response in keep]
+                    self.vector_store.add([row[0] for row in keep], model.encode(texts, batch_size=64))
+                    embedded += len(keep)
+                if len(rows) < batch_size:
+                    break
+            if self.vector_store.needs_index():
+                self.vector_store.build_index()
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error embedding interactions: {e}")
+        return embedded
+
+    def start_embedding_job(self, interval=30):
+        """Embed new interactions in a background thread every interval seconds."""
+        if self._embedding_thread is not None and self._embedding_thread.is_alive():
+            return
+
+        def run():
+            while not self._embedding_stop.is_set():
+                count = self.embed_new_interactions()
+                if count and self.logger:
+                    self.logger.log_memory("Embed Interactions", f"Embedded {count} interactions.")
+                self._embedding_stop.wait(interval)
+
+        self._embedding_stop.clear()
+        self._embedding_thread = threading.Thread(target=run, daemon=True)
+        self._embedding_thread.start()
+
+    def recall(self, text, k=5, min_score=0.3):
+        """Return up to k past interactions most similar to text, best first."""
+        if not len(self.vector_store) or not text:
+            return []
+        model = self._load_embedding_model()
+        if model is None:
+            return []
+        try:
+            matches = [(interaction_id, score) for interaction_id, score
+                       in self.vector_store.search(model.encode([text])[0], k) if score >= min_score]
+            if not matches:
+                return []
+            with self._get_read_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT {INTERACTION_COLUMNS} FROM all_interactions WHERE id IN ({', '.join('?' * len(matches))})",
+                    [interaction_id for interaction_id, _ in matches]
+                )
+                rows = {row[0]: row for row in cursor.fetchall()}
+            return [rows[interaction_id] for interaction_id, _ in matches if interaction_id in rows]
+        except MemoryError as e:
+            if self.logger:
+                self.logger.log_error(f"Error recalling interactions: {e}")
+            return []
+
+    def backup(self, backup_dir=None, pages=256, sleep=0.01, keep=24, verify=True):
+        """Write a consistent snapshot of the main and archive databases without blocking writers.
+
+        The copy runs on its own read-only connection inside one read transaction, so WAL
+        gives it a fixed snapshot while the writer keeps committing. pages are copied per
+        step with sleep seconds in between. Snapshots are checked with PRAGMA integrity_check
+        and only the newest keep are retained. Returns the snapshot path, or None on failure.
+        """
+        backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "backups")
+        os.makedirs(backup_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        targets = {"main": os.path.join(backup_dir, f"{stem}-{stamp}.db"),
+                   "archive": os.path.join(backup_dir, f"{stem}-{stamp}.archive.db")}
+        start = time.perf_counter()
+        source = None
+        try:
+            source = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                     isolation_level=None, check_same_thread=False)
+            source.execute("ATTACH DATABASE ? AS archive", (f"file:{os.path.abspath(self.archive_path)}?mode=ro",))
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM main.sqlite_master")
+            source.execute("SELECT COUNT(*) FROM archive.sqlite_master")
+            for name, target_path in targets.items():
+                partial_path = f"{target_path}.partial"
+                target = sqlite3.connect(partial_path)
+                try:
+                    source.backup(target, pages=pages, name=name, sleep=sleep)
+                    if verify:
+                        result = target.execute("PRAGMA integrity_check").fetchone()[0]
+                        if result != "ok":
+                            raise MemoryError(f"Integrity check failed for {name} snapshot: {result}")
+                finally:
+                    target.close()
+                os.replace(partial_path, target_path)
+            source.execute("COMMIT")
+        except (sqlite3.Error, MemoryError, OSError) as e:
+            for target_path in targets.values():
+                for path in (target_path, f"{target_path}.partial"):
+                    if os.path.exists(path):
+                        os.remove(path)
+            if self.logger:
+                self.logger.log_error(f"Error backing up database: {e}")
+            return None
+        finally:
+            if source is not None:
+                source.close()
+
+        snapshots = sorted(name for name in os.listdir(backup_dir)
+                           if name.startswith(f"{stem}-") and name.endswith(".db") and not name.endswith(".archive.db"))
+        for name in snapshots[:-keep] if keep else []:
+            for path in (name, f"{name[:-3]}.archive.db"):
+                try:
+                    os.remove(os.path.join(backup_dir, path))
+                except FileNotFoundError:
+                    pass
+        if self.logger:
+            self.logger.log_memory("Backup", f"Wrote snapshot {targets['main']} in {time.perf_counter() - start:.1f}s.")
+        return targets["main"]
+
+    def start_backup_job(self, interval=3600, **options):
+        """Prune unreferenced analysis blobs and take a backup every interval seconds; options go to backup()."""
+        if self._backup_thread is not None and self._backup_thread.is_alive():
+            return
+
+        def run():
+            while not self._backup_stop.wait(interval):
+                self.prune_analysis_blobs()
+                self.backup(**options)
+
+        self._backup_stop.clear()
+        self._backup_thread = threading.Thread(target=run, daemon=True)
+        self._backup_thread.start()
 
     def close(self):
         """Close the database connection properly."""
+        if self.file_manager is not None:
+            self.file_manager.stop_monitoring()
+            self.file_manager = None
+        self._embedding_stop.set()
+        if self._embedding_thread is not None:
+            self._embedding_thread.join()
+        self._backup_stop.set()
+        if self._backup_thread is not None:
+            self._backup_thread.join()
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            self._write_queue.put(_STOP_WRITER)
+            self._writer_thread.join()
+        while True:
+            try:
+                conn, _ = self._idle_readers.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+        with self._reader_lock:
+            self._reader_count = 0
         self.conn.close()
         if self.logger:
             self.logger.log_memory("Close Connection", "Closed database connection.")
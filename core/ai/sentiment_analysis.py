@@ -8,7 +8,7 @@ from Snowball.core.ai.memory import Memory
 class SentimentAnalysis:
     def __init__(self, logger=None, memory=None, openai_api_key=None, escalation_threshold=20, neutral_confidence=0.6):
         self.logger = logger or SnowballLogger()
-        self.memory = memory or Memory(logger=self.logger)
+        self.memory = memory or Memory.shared(logger=self.logger)
         self.openai_api_key = openai_api_key
         self.escalation_threshold = escalation_threshold
         self.neutral_confidence = neutral_confidence
@@ -108,7 +108,7 @@ class SentimentAnalysis:
 
 if __name__ == "__main__":
     logger = SnowballLogger()
-    memory = Memory(logger=logger)
+    memory = Memory.shared(logger=logger)
     openai_api_key = "your-openai-api-key-here"
 
     sentiment_analyzer = SentimentAnalysis(logger=logger, memory=memory, openai_api_key=openai_api_key)
@@ -0,0 +1,131 @@
+import os
+import threading
+import numpy as np
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+class VectorStore:
+    """Append-only store of unit-length float32 embeddings kept in a memory-mapped file.
+
+    Vectors live in <path>.vectors as one contiguous N x dim float32 matrix and their
+    interaction ids in <path>.ids. Search is exact (one matrix-vector product) until the
+    store holds ann_threshold rows, after which an inverted-file index over k-means
+    centroids narrows each query to the nprobe closest clusters.
+    """
+
+    def __init__(self, path, dim=EMBEDDING_DIM, logger=None, ann_threshold=50000, nprobe=8):
+        self.path = path
+        self.dim = dim
+        self.logger = logger
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._centroids = None
+        self._lists = None
+        self._indexed_count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def last_id(self):
+        """Highest interaction id embedded so far, or 0 when empty."""
+        return int(self._ids.max()) if len(self._ids) else 0
+
+    def _load(self):
+        vectors_path, ids_path = f"{self.path}.vectors", f"{self.path}.ids"
+        if not os.path.exists(vectors_path) or not os.path.exists(ids_path):
+            return
+        count = min(os.path.getsize(vectors_path) // (self.dim * 4), os.path.getsize(ids_path) // 8)
+        if count:
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+            self._ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(count,))
+
+    def add(self, ids, vectors):
+        """Append embeddings for the given interaction ids."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            count = len(self._ids)
+            self._append(f"{self.path}.vectors", count * self.dim * 4, vectors)
+            self._append(f"{self.path}.ids", count * 8, ids)
+            self._load()
+            if self._lists is not None:
+                self._assign(np.arange(count, len(self._ids)), self._centroids, self._lists)
+
+    @staticmethod
+    def _append(file_path, expected_size, array):
+        with open(file_path, "ab") as f:
+            # Trim a partial row left by an interrupted write before appending.
+            if f.tell() > expected_size:
+                f.truncate(expected_size)
+            f.write(array.tobytes())
+
+    def search(self, query, k=5):
+        """Return up to k (interaction_id, cosine similarity) pairs, best first."""
+        vectors, ids, centroids, lists = self._vectors, self._ids, self._centroids, self._lists
+        if not len(ids):
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if centroids is not None:
+            probe = np.argsort(centroids @ query)[-self.nprobe:]
+            rows = np.concatenate([lists[c] for c in probe] + [np.arange(self._indexed_count, len(ids))])
+            rows = rows[rows < len(ids)]
+            scores = vectors[rows] @ query
+        else:
+            rows = None
+            scores = vectors @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = rows[top] if rows is not None else top
+        return [(int(ids[p]), float(scores[i])) for i, p in zip(top, positions)]
+
+    def needs_index(self):
+        """True once the store is large enough for the ANN index and it is missing or out of date."""
+        count = len(self._ids)
+        return count >= self.ann_threshold and (self._centroids is None or count > 2 * self._indexed_count)
+
+    def build_index(self, nlist=None, iterations=10, sample_size=100000):
+        """Cluster the vectors with k-means and build the inverted lists used by search."""
+        vectors = self._vectors
+        count = len(vectors)
+        if not count:
+            return
+        nlist = nlist or max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[rng.choice(count, min(count, sample_size), replace=False)])
+        centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[labels == c]
+                if len(members):
+                    center = members.mean(axis=0)
+                    centroids[c] = center / max(float(np.linalg.norm(center)), 1e-12)
+
+        with self._lock:
+            lists = [np.zeros(0, dtype=np.int64) for _ in range(len(centroids))]
+            self._assign(np.arange(len(self._ids)), centroids, lists)
+            self._centroids, self._lists = centroids, lists
+        if self.logger:
+            self.logger.log_memory("Vector Index", f"Built {len(centroids)}-list index over {count} embeddings.")
+
+    def _assign(self, rows, centroids, lists, chunk_size=65536):
+        """Add rows to the inverted list of their nearest centroid."""
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            labels = np.argmax(self._vectors[chunk] @ centroids.T, axis=1)
+            for c in np.unique(labels):
+                lists[c] = np.concatenate([lists[c], chunk[labels == c]])
+        self._indexed_count = len(self._ids)
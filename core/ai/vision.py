@@ -71,7 +71,7 @@ class Vision:
             emotion = emotions[emotion_label]
             
             # Store the recognized emotion in memory for future context
-            self.memory.store_interaction("Emotion detected", emotion)
+            self.memory.store_interaction("Emotion detected", emotion, intern=True)
             return emotion
         except Exception as e:
             self.logger.log_error(f"Error detecting emotion: {e}")
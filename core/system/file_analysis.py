@@ -0,0 +1,62 @@
+"""Content extraction for FileManager's analysis worker processes.
+
+Everything here runs in a child process, so the module stays free of TensorFlow:
+workers start quickly and the Keras models are loaded once, in the main process,
+which runs the predictions and stores the results.
+"""
+import os
+import csv
+import numpy as np
+from PyPDF2 import PdfReader
+import docx
+from PIL import Image
+import pytesseract
+import openpyxl
+
+IMAGE_SIZE = (224, 224)
+
+ANALYSIS_TYPES = {
+    '.pdf': 'pdf',
+    '.docx': 'docx',
+    '.txt': 'text',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.png': 'image',
+    '.csv': 'csv',
+    '.xlsx': 'excel',
+}
+
+def analysis_type(file_path):
+    """Return the analysis type for a file, or None if it is not analysed."""
+    return ANALYSIS_TYPES.get(os.path.splitext(file_path)[1].lower())
+
+def extract(file_path, kind):
+    """Extract the content of one file.
+
+    Returns a dict with the text to store ("text"), the number of rows for tabular
+    files ("rows") and, for images, the normalized 224x224 RGB array ("pixels").
+    """
+    if kind == 'pdf':
+        reader = PdfReader(file_path)
+        return {"text": ''.join(page.extract_text() for page in reader.pages)}
+    if kind == 'docx':
+        document = docx.Document(file_path)
+        return {"text": ' '.join(paragraph.text for paragraph in document.paragraphs)}
+    if kind == 'text':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return {"text": f.read()}
+    if kind == 'image':
+        image = Image.open(file_path)
+        text = pytesseract.image_to_string(image)
+        # Same preprocessing as keras load_img(target_size=...): RGB, nearest-neighbour resize.
+        pixels = np.asarray(image.convert('RGB').resize(IMAGE_SIZE, Image.NEAREST), dtype=np.float32) / 255.0
+        return {"text": text, "pixels": pixels}
+    if kind == 'csv':
+        with open(file_path, 'r') as f:
+            rows = list(csv.reader(f))
+        return {"text": '\n'.join(','.join(row) for row in rows), "rows": len(rows)}
+    if kind == 'excel':
+        workbook = openpyxl.load_workbook(file_path)
+        lines = [' '.join(map(str, row)) for sheet in workbook for row in sheet.iter_rows(values_only=True)]
+        return {"text": '\n'.join(lines), "rows": len(lines)}
+    raise ValueError(f"Unsupported analysis type: {kind}")
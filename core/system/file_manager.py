@@ -3,19 +3,187 @@ import hashlib
 import threading
 import time
 import queue
-from queue import PriorityQueue
+import heapq
+import itertools
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import tensorflow as tf
 from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from PyPDF2 import PdfReader
-import docx
-from PIL import Image
-import pytesseract
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from datetime import datetime
-import csv
-import openpyxl
+import numpy as np
+from Snowball.core.system import file_analysis
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes read per step, so hashing never holds a whole file in memory
+
+# Concurrent worker processes allowed per analysis type, so a burst of one kind of
+# file (say, scanned PDFs) cannot take every worker.
+DEFAULT_TYPE_LIMITS = {'pdf': 2, 'docx': 2, 'text': 4, 'image': 2, 'csv': 2, 'excel': 1}
+
+TEXT_MODEL_TYPES = {'pdf': 'PDF', 'docx': 'DOCX', 'text': 'TXT'}
+
+# Tries per file when a worker process dies; the file that crashed it is given up after this.
+ANALYSIS_ATTEMPTS = 2
+
+class ProcessedChecksums:
+    """Set of checksums whose content has already been analysed.
+
+    Checksums persisted in file_metadata are held as one sorted fixed-width byte array
+    (40 bytes per entry) and looked up by binary search; checksums added since startup
+    go to a small set until the next load.
+    """
+
+    def __init__(self, checksums=()):
+        self._sorted = np.array([checksum.encode('ascii') for checksum in checksums], dtype='S40')
+        self._sorted.sort()
+        self._recent = set()
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, checksum):
+        if checksum in self._recent:
+            return True
+        key = checksum.encode('ascii')
+        index = np.searchsorted(self._sorted, key)
+        return index < len(self._sorted) and self._sorted[index] == key
+
+    def add(self, checksum):
+        self._recent.add(checksum)
+
+class PredictionBatcher:
+    """Groups single-item predictions for one Keras model into batched predict() calls.
+
+    Items wait until batch_size have arrived or the oldest has waited max_delay seconds,
+    then prepare() turns the list into one model input (np.stack for image arrays, a
+    plain list for texts). Each callback receives its own row of the output, or the
+    exception if the batch failed.
+    """
+
+    def __init__(self, model, prepare, batch_size=32, max_delay=0.05):
+        self.model = model
+        self.prepare = prepare
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, model_input, callback):
+        self._queue.put((model_input, callback))
+
+    def close(self):
+        """Predict whatever is still queued, then stop the batching thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                predictions = self.model.predict(self.prepare([model_input for model_input, _ in batch]))
+            except Exception as e:
+                for _, callback in batch:
+                    callback(None, e)
+                continue
+            for (_, callback), prediction in zip(batch, predictions):
+                callback(prediction, None)
+
+class CoalescingQueue:
+    """Pending file events keyed by path, so an event storm on one file yields one unit of work.
+
+    A put() for a path that is already pending keeps the more urgent (lower) priority and
+    restarts its settle delay instead of adding a second entry. get() only hands out
+    paths that have been quiet for settle_delay seconds, most urgent first. put() and
+    get() take and return (priority, path) tuples like PriorityQueue.
+    """
+
+    def __init__(self, settle_delay=1.0):
+        self.settle_delay = settle_delay
+        self._condition = threading.Condition()
+        self._pending = {}   # path -> [priority, ready_at]
+        self._settling = []  # heap of (ready_at, path); entries superseded by a later event are skipped
+        self._ready = []     # heap of (priority, sequence, path) for settled paths
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def empty(self):
+        return len(self) == 0
+
+    def put(self, item):
+        priority, path = item
+        with self._condition:
+            ready_at = time.monotonic() + self.settle_delay
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = [priority, ready_at]
+            else:
+                entry[0] = min(entry[0], priority)
+                entry[1] = ready_at
+            heapq.heappush(self._settling, (ready_at, path))
+            self._condition.notify()
+
+    def discard(self, path):
+        """Forget a pending path, e.g. because the file was deleted."""
+        with self._condition:
+            self._pending.pop(path, None)
+
+    def get(self, timeout=None):
+        """Return the most urgent settled (priority, path); raises queue.Empty after timeout seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._settling and self._settling[0][0] <= now:
+                    ready_at, path = heapq.heappop(self._settling)
+                    entry = self._pending.get(path)
+                    if entry is not None and entry[1] == ready_at:
+                        heapq.heappush(self._ready, (entry[0], next(self._sequence), path))
+                while self._ready:
+                    _, _, path = heapq.heappop(self._ready)
+                    entry = self._pending.get(path)
+                    if entry is not None and entry[1] <= now:
+                        del self._pending[path]
+                        return entry[0], path
+                waits = [self._settling[0][0] - now] if self._settling else []
+                if deadline is not None:
+                    if deadline <= now:
+                        raise queue.Empty
+                    waits.append(deadline - now)
+                self._condition.wait(min(waits) if waits else None)
+
+    def drain(self):
+        """Remove and return every pending (priority, path), settled or not, most urgent first."""
+        with self._condition:
+            items = sorted((priority, path) for path, (priority, _) in self._pending.items())
+            self._pending.clear()
+            self._settling.clear()
+            self._ready.clear()
+            return items
 
 class FileEventHandler(FileSystemEventHandler):
     """Custom event handler for file system changes."""
@@ -32,6 +200,7 @@ class FileEventHandler(FileSystemEventHandler):
     def on_deleted(self, event):
         if not event.is_directory:
             self.logger.log_file(f"File deleted: {event.src_path}")
+            self.priority_queue.discard(event.src_path)
 
     def on_modified(self, event):
         if not event.is_directory:
@@ -39,12 +208,14 @@ class FileEventHandler(FileSystemEventHandler):
             self.priority_queue.put((0, event.src_path))  # High priority for modification
 
 class FileManager:
-    def __init__(self, logger, memory, scan_dir='S:/', allowed_extensions=None, scan_interval=10):
+    def __init__(self, logger, memory, scan_dir='S:/', allowed_extensions=None, scan_interval=10,
+                 analysis_workers=None, type_limits=None, predict_batch_size=32, predict_delay_ms=50,
+                 settle_delay=1.0):
         self.logger = logger
         self.memory = memory
         self.scan_dir = scan_dir
-        self.priority_queue = PriorityQueue()
-        self.processed_hashes = set()
+        self.priority_queue = CoalescingQueue(settle_delay)
+        self.processed_hashes = ProcessedChecksums(memory.iter_processed_checksums())
         self.hash_lock = threading.Lock()
         self.observer = Observer()
         self.allowed_extensions = allowed_extensions or {
@@ -54,9 +225,25 @@ class FileManager:
         self.stop_event = threading.Event()
 
         # Initialize cooldown mechanism
-        self.last_processed_files = {}  # Dictionary to track cooldowns
+        self.last_processed_files = OrderedDict()  # Path -> last processed time, oldest first
         self.cooldown_period = 2  # Cooldown period in seconds
 
+        # Analysis worker processes, started with monitoring; until then files are analysed inline
+        self.analysis_workers = analysis_workers or os.cpu_count() or 1
+        self.type_limits = dict(DEFAULT_TYPE_LIMITS, **(type_limits or {}))
+        self.analysis_pool = None
+        self._analysis_results = queue.Queue()
+        self._analysis_collector = None
+        self._analysis_lock = threading.Condition()
+        self._running = {}    # analysis type -> files being extracted
+        self._waiting = {}    # analysis type -> deque of (file_path, file_hash) over its limit
+        self._pending = 0     # dispatched files not yet stored
+        self._in_flight = set()
+        self.predict_batch_size = predict_batch_size
+        self.predict_delay = predict_delay_ms / 1000.0
+        self.text_batcher = None
+        self.image_batcher = None
+
         # Load pre-trained models
         self.image_model = self.load_image_model()
         self.text_model = self.load_text_model()
@@ -95,209 +282,488 @@ class FileManager:
         if not os.path.exists('S:/Snowball/models/image_classification_model.h5'):
             self.logger.log_error("Image classification model is missing.")
 
-    def hash_file(self, file_path):
-        hasher = hashlib.md5()
+    def hash_file(self, file_path, chunk_size=HASH_CHUNK_SIZE):
+        """Return the BLAKE2b checksum of a file.
+
+        The checksum stored by the previous call is reused without reading the file when
+        its size, mtime_ns and inode are unchanged. Otherwise the file is read in chunk_size
+        pieces into one reusable buffer.
+        """
         try:
-            with open(file_path, 'rb') as f:
-                hasher.update(f.read())
-            return hasher.hexdigest()
+            stat = os.stat(file_path)
+            fingerprint = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            stored = self.memory.get_file_fingerprint(file_path)
+            if stored and stored[3] and tuple(stored[:3]) == fingerprint:
+                return stored[3]
+
+            hasher = hashlib.blake2b(digest_size=20)
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            with open(file_path, 'rb', buffering=0) as f:
+                while True:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    hasher.update(view[:read])
+            checksum = hasher.hexdigest()
+
+            # Only remember the checksum if the file did not change while it was being read.
+            after = os.stat(file_path)
+            if (after.st_size, after.st_mtime_ns, after.st_ino) == fingerprint:
+                self.memory.store_file_checksum(file_path, *fingerprint, checksum)
+            return checksum
         except Exception as e:
             self.logger.log_error(f"Error hashing file: {e}")
             return None
 
-    def scan_and_index_drive(self, batch_size=100):
-        """Scan and index all files in batches."""
+    def scan_and_index_drive(self, batch_size=1000, workers=8, progress_interval=30, incremental=False):
+        """Scan and index all files in batches.
+
+        workers threads list directories with os.scandir in parallel, taking size and
+        mtime from the DirEntry stat so each file costs at most one stat call. Each listed
+        directory is recorded in the directory journal, and files or subdirectories gone
+        since its previous listing are dropped from the index. A file that shows up under a
+        new path with the inode and size of a vanished one is treated as renamed and keeps
+        its row (checksum, analysis, tags).
+
+        With incremental=True a directory whose mtime still matches the journal is not
+        listed again; the walk continues into the subdirectories recorded for it. Edits to
+        existing files do not touch their directory's mtime and are left to the file monitor.
+
+        The calling thread writes rows with store_file_metadata_many and logs files/sec every
+        progress_interval seconds. Returns the number of files indexed.
+        """
+        mode = "incremental" if incremental else "full"
+        self.logger.log_file(f"Starting {mode} drive scan and index", self.scan_dir)
+        start = time.monotonic()
+        directories = queue.Queue()
+        directories.put((self.scan_dir, None, False))
+        results = queue.Queue(maxsize=batch_size * 4)  # Bounded so walkers wait for a slow writer
+        pending = [1]  # Directories queued or being listed
+        pending_lock = threading.Lock()
+        finished = threading.Event()
+
+        def emit(kind, payload):
+            while not finished.is_set():
+                try:
+                    results.put((kind, payload), timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def visit(directory, parent, tracked):
+            """List one directory if needed; returns (subdirectory, tracked) pairs to walk next."""
+            mtime_ns = os.stat(directory).st_mtime_ns
+            journal = self.memory.get_directory_journal(directory)
+            known = self.memory.get_journal_subdirectories(directory) if journal else []
+            # Rename candidates are only collected below directories seen by an earlier scan,
+            # so a first full index does not hold every path in memory.
+            tracked = tracked or journal is not None
+            if incremental and journal and journal[0] == mtime_ns:
+                return [(subdirectory, True) for subdirectory in known]
+
+            indexed = self.memory.list_directory_files(directory)
+            subdirectories, files, present = self._scan_directory(directory)
+            for row in files:
+                emit("file", row)
+            emit("directory", (directory, parent, mtime_ns, len(subdirectories) + len(present)))
+
+            # Compared against every file on disk, not just allowed_extensions: the monitor and
+            # hash_file also keep rows (analysis, checksums) for other types.
+            removed = [row for row in indexed if row[0] not in present]
+            if removed:
+                emit("removed", removed)
+            gone = set(known) - set(subdirectories)
+            if gone:
+                emit("gone", list(gone))
+            if tracked:
+                stored = {row[0] for row in indexed}
+                appeared = []
+                for name, path, last_modified, size in files:
+                    if path not in stored:
+                        try:
+                            appeared.append((path, size, os.stat(path).st_ino, last_modified))
+                        except OSError:
+                            continue
+                if appeared:
+                    emit("appeared", appeared)
+            return [(subdirectory, tracked) for subdirectory in subdirectories]
+
+        def walk():
+            while not finished.is_set() and not self.stop_event.is_set():
+                try:
+                    directory, parent, tracked = directories.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                try:
+                    children = visit(directory, parent, tracked)
+                    with pending_lock:
+                        pending[0] += len(children)
+                    for subdirectory, child_tracked in children:
+                        directories.put((subdirectory, directory, child_tracked))
+                except OSError as e:
+                    self.logger.log_warning(f"Skipping unreadable directory {directory}: {e}")
+                except Exception as e:
+                    # Skip the directory rather than lose the walker: pending would never reach zero.
+                    self.logger.log_error(f"Error scanning directory {directory!r}: {e}")
+                finally:
+                    with pending_lock:
+                        pending[0] -= 1
+                        if pending[0] == 0:
+                            finished.set()
+
+        threads = [threading.Thread(target=walk, daemon=True) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+
+        indexed = 0
+        batch, journal_rows = [], []
+        removed, gone, appeared = [], [], []
+        last_report = start
         try:
-            self.logger.log_file("Starting drive scan and index.")
-            files_to_process = []
-            for root, _, files in os.walk(self.scan_dir):
-                for file_name in files:
-                    if os.path.splitext(file_name)[1].lower() not in self.allowed_extensions:
-                        continue
-                    file_path = os.path.join(root, file_name)
-                    files_to_process.append(file_path)
-                    if len(files_to_process) >= batch_size:
-                        self._process_batch(files_to_process)
-                        files_to_process.clear()
-            if files_to_process:
-                self._process_batch(files_to_process)
-            self.logger.log_file("Drive scan and indexing completed.")
+            while not (finished.is_set() and results.empty()) and not self.stop_event.is_set():
+                try:
+                    kind, payload = results.get(timeout=0.1)
+                    if kind == "file":
+                        batch.append(payload)
+                    elif kind == "directory":
+                        journal_rows.append(payload)
+                    elif kind == "removed":
+                        removed.extend(payload)
+                    elif kind == "gone":
+                        gone.extend(payload)
+                    elif kind == "appeared":
+                        appeared.extend(payload)
+                except queue.Empty:
+                    pass
+                drained = finished.is_set() and results.empty()
+                if len(batch) >= batch_size or (batch and drained):
+                    indexed += self._process_batch(batch)
+                    batch = []
+                if len(journal_rows) >= batch_size or (journal_rows and drained):
+                    self.memory.store_directory_journal(journal_rows)
+                    journal_rows = []
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    self.logger.log_file(
+                        f"Indexed {indexed} files ({indexed / (now - start):.0f} files/sec)", self.scan_dir
+                    )
+            if batch:
+                indexed += self._process_batch(batch)
+            if journal_rows:
+                self.memory.store_directory_journal(journal_rows)
+            if not self.stop_event.is_set():
+                self._reconcile_removed(removed, gone, appeared)
         except Exception as e:
             self.logger.log_error(f"Error scanning and indexing drive: {e}")
+        finally:
+            finished.set()
+            for thread in threads:
+                thread.join()
+
+        elapsed = max(time.monotonic() - start, 1e-9)
+        self.logger.log_file(
+            f"Drive scan ({mode}) completed: {indexed} files in {elapsed:.1f}s ({indexed / elapsed:.0f} files/sec)",
+            self.scan_dir
+        )
+        return indexed
+
+    def _reconcile_removed(self, removed, gone, appeared):
+        """Apply renames found during a scan, then drop files and directories that no longer exist."""
+        candidates = list(removed)
+        for directory in gone:
+            candidates.extend(self.memory.list_directory_files(directory, recursive=True))
+        by_identity = {(inode, size): path for path, size, inode in candidates if inode is not None}
+        moved = set()
+        for new_path, size, inode, last_modified in appeared:
+            old_path = by_identity.pop((inode, size), None)
+            if old_path is not None:
+                self.memory.move_file_metadata(old_path, new_path, last_modified)
+                moved.add(old_path)
+        deleted = self.memory.delete_file_metadata([path for path, _, _ in removed if path not in moved])
+        deleted += self.memory.delete_directory_tree(gone)
+        if moved or deleted:
+            self.logger.log_file(f"Reconciled index: {len(moved)} renamed, {deleted} removed", self.scan_dir)
+
+    def _scan_directory(self, directory):
+        """List one directory.
+
+        Returns its subdirectories, metadata rows for its allowed files and the set of all
+        file paths in it. Names that are not valid in the filesystem encoding (surrogate-escaped
+        by os.scandir) are skipped, since SQLite cannot store them.
+        """
+        subdirectories, files, present = [], [], set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    entry.path.encode('utf-8')
+                except UnicodeEncodeError:
+                    self.logger.log_warning(f"Skipping undecodable path {entry.path!r}")
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                        continue
+                    present.add(entry.path)
+                    if entry.is_file(follow_symlinks=False) \
+                            and os.path.splitext(entry.name)[1].lower() in self.allowed_extensions:
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.name, entry.path, datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                                      stat.st_size))
+                except OSError:
+                    continue
+        return subdirectories, files, present
     
     def analyze_file(self, file_path):
-        """Analyze a file based on its type."""
-        ext = os.path.splitext(file_path)[1].lower()
-
-        if ext == '.pdf':
-            self.analyze_pdf(file_path)
-        elif ext == '.docx':
-            self.analyze_docx(file_path)
-        elif ext == '.txt':
-            self.analyze_text(file_path)
-        elif ext in ['.jpg', '.jpeg', '.png']:
-            self.analyze_image(file_path)
-        elif ext == '.csv':
-            self.analyze_csv(file_path)
-        elif ext == '.xlsx':
-            self.analyze_excel(file_path)
-        else:
+        """Analyze a file based on its type, in the calling thread."""
+        kind = file_analysis.analysis_type(file_path)
+        if kind is None:
             self.logger.log_warning(f"Unsupported file type skipped: {file_path}")
-
-    def analyze_pdf(self, file_path):
-        """Extract and analyze text from a PDF file."""
-        if not self.text_model:
-            self.logger.log_warning(f"Text model unavailable. Skipping PDF analysis for {file_path}.")
             return
+        if self._model_ready(kind, file_path):
+            self._analyze(file_path, kind)
 
+    def _analyze(self, file_path, kind, done=None):
         try:
-            reader = PdfReader(file_path)
-            text = ''.join(page.extract_text() for page in reader.pages)
-
-            prediction = self.text_model.predict([text])
-            document_type = "Important" if prediction[0] > 0.5 else "General"
-
-            self.logger.log_task(f"Analyzed PDF file: {file_path} (Type: {document_type})", "Analyzed")
-            self.memory.store_file_analysis(file_path, text)
+            result = file_analysis.extract(file_path, kind)
         except Exception as e:
-            self.logger.log_error(f"Error analyzing PDF file: {file_path}, {e}")
-
-    def analyze_docx(self, file_path):
-        """Extract and analyze text from a DOCX file."""
-        if not self.text_model:
-            self.logger.log_warning(f"Text model unavailable. Skipping DOCX analysis for {file_path}.")
+            self.logger.log_error(f"Error analyzing {kind} file: {file_path}, {e}")
+            if done is not None:
+                done(False)
             return
+        self._complete_analysis(file_path, kind, result, done)
+
+    def _model_ready(self, kind, file_path):
+        """Check the model an analysis type needs is loaded, logging why the file is skipped if not."""
+        if kind in TEXT_MODEL_TYPES and not self.text_model:
+            self.logger.log_warning(
+                f"Text model unavailable. Skipping {TEXT_MODEL_TYPES[kind]} analysis for {file_path}."
+            )
+            return False
+        if kind == 'image' and not self.image_model:
+            self.logger.log_warning(f"Image model unavailable. Skipping image analysis for {file_path}.")
+            return False
+        return True
 
-        try:
-            doc = docx.Document(file_path)
-            text = ' '.join(paragraph.text for paragraph in doc.paragraphs)
-
-            prediction = self.text_model.predict([text])
-            document_type = "Important" if prediction[0] > 0.5 else "General"
-
-            self.logger.log_task(f"Analyzed DOCX file: {file_path} (Type: {document_type})", "Analyzed")
-            self.memory.store_file_analysis(file_path, text)
-        except Exception as e:
-            self.logger.log_error(f"Error analyzing DOCX file: {file_path}, {e}")
+    def _complete_analysis(self, file_path, kind, result, done=None):
+        """Classify extracted content with the loaded models and store it; runs in the main process.
+
+        While the batchers run, the prediction is queued and the result stored from the
+        batcher thread. done(success) is called once the file is finished either way.
+        """
+        def store(prediction, error):
+            success = False
+            try:
+                if error is not None:
+                    raise error
+                if kind in TEXT_MODEL_TYPES:
+                    document_type = "Important" if prediction > 0.5 else "General"
+                    self.logger.log_task(
+                        f"Analyzed {TEXT_MODEL_TYPES[kind]} file: {file_path} (Type: {document_type})", "Analyzed"
+                    )
+                elif kind == 'image':
+                    classification = "Relevant" if prediction > 0.5 else "Irrelevant"
+                    self.logger.log_task(f"Analyzed Image file: {file_path} (Classification: {classification})", "Analyzed")
+                else:
+                    self.logger.log_task(f"Analyzed {kind.upper()} file: {file_path} with {result['rows']} rows.", "Analyzed")
+                self.memory.store_file_analysis(file_path, result["text"])
+                success = True
+            except Exception as e:
+                self.logger.log_error(f"Error analyzing {kind} file: {file_path}, {e}")
+            finally:
+                if done is not None:
+                    done(success)
+
+        if kind in TEXT_MODEL_TYPES:
+            self._predict(self.text_model, self.text_batcher, list, result["text"], store)
+        elif kind == 'image':
+            self._predict(self.image_model, self.image_batcher, np.stack, result["pixels"], store)
+        else:
+            store(None, None)
 
-    def analyze_text(self, file_path):
-        """Extract and analyze text from a TXT file."""
-        if not self.text_model:
-            self.logger.log_warning(f"Text model unavailable. Skipping TXT analysis for {file_path}.")
+    @staticmethod
+    def _predict(model, batcher, prepare, model_input, callback):
+        if batcher is not None:
+            batcher.submit(model_input, callback)
             return
-
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-
-            prediction = self.text_model.predict([text])
-            document_type = "Important" if prediction[0] > 0.5 else "General"
-
-            self.logger.log_task(f"Analyzed TXT file: {file_path} (Type: {document_type})", "Analyzed")
-            self.memory.store_file_analysis(file_path, text)
+            prediction = model.predict(prepare([model_input]))[0]
         except Exception as e:
-            self.logger.log_error(f"Error analyzing TXT file: {file_path}, {e}")
-
-    def analyze_image(self, file_path):
-        """Perform OCR and image classification on an image file."""
-        if not self.image_model:
-            self.logger.log_warning(f"Image model unavailable. Skipping image analysis for {file_path}.")
+            callback(None, e)
             return
+        callback(prediction, None)
 
+    def _process_batch(self, rows):
+        """Write (name, path, last_modified, size) rows in one bulk call; returns the number stored."""
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-
-            img = load_img(file_path, target_size=(224, 224))
-            img_array = img_to_array(img) / 255.0
-            img_array = img_array.reshape((1, *img_array.shape))
-            prediction = self.image_model.predict(img_array)
-            classification = "Relevant" if prediction[0] > 0.5 else "Irrelevant"
-
-            self.logger.log_task(f"Analyzed Image file: {file_path} (Classification: {classification})", "Analyzed")
-            self.memory.store_file_analysis(file_path, text)
-        except Exception as e:
-            self.logger.log_error(f"Error analyzing Image file: {file_path}, {e}")
-
-    def analyze_csv(self, file_path):
-        """Analyze a CSV file."""
-        try:
-            with open(file_path, 'r') as f:
-                reader = csv.reader(f)
-                rows = list(reader)
-                self.logger.log_task(f"Analyzed CSV file: {file_path} with {len(rows)} rows.", "Analyzed")
-                self.memory.store_file_analysis(file_path, str(rows))
-        except Exception as e:
-            self.logger.log_error(f"Error analyzing CSV file: {file_path}, {e}")
-
-    def analyze_excel(self, file_path):
-        """Analyze an Excel file."""
-        try:
-            workbook = openpyxl.load_workbook(file_path)
-            text = []
-            for sheet in workbook:
-                for row in sheet.iter_rows(values_only=True):
-                    text.append(' '.join(map(str, row)))
-
-            self.logger.log_task(f"Analyzed Excel file: {file_path} with {len(text)} rows.", "Analyzed")
-            self.memory.store_file_analysis(file_path, '\n'.join(text))
-        except Exception as e:
-            self.logger.log_error(f"Error analyzing Excel file: {file_path}, {e}")
-
-    def _process_batch(self, files):
-        try:
-            log_messages = []
-            for file_path in files:
-                last_modified = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-                self.memory.store_file_metadata(os.path.basename(file_path), file_path, last_modified)
-                log_messages.append(f"Indexed file: {file_path}")
-            if log_messages:
-                self.logger.log_file(f"Batch processed {len(files)} files:\n" + "\n".join(log_messages))
+            return self.memory.store_file_metadata_many(rows, batch_size=len(rows))
         except Exception as e:
             self.logger.log_error(f"Error processing batch: {e}")
+            return 0
 
     def should_process_file(self, file_path):
-        current_time = time.time()
+        current_time = time.monotonic()
+        # Entries are kept in processing order, so expired ones are always at the front.
+        while self.last_processed_files:
+            oldest_path, processed_at = next(iter(self.last_processed_files.items()))
+            if current_time - processed_at < self.cooldown_period:
+                break
+            del self.last_processed_files[oldest_path]
         if file_path in self.last_processed_files:
-            if current_time - self.last_processed_files[file_path] < self.cooldown_period:
-                return False
+            return False
         self.last_processed_files[file_path] = current_time
         return True
 
     def process_file(self, file_path):
-        """Analyze a file based on its type."""
-        try:
-            file_hash = self.hash_file(file_path)
-            with self.hash_lock:
-                if not file_hash or file_hash in self.processed_hashes:
-                    self.logger.log_file(f"File already processed: {file_path}", "Skipped")
-                    return
+        """Analyze a file based on its type.
 
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext == '.pdf':
-                self.analyze_pdf(file_path)
-            elif ext == '.docx':
-                self.analyze_docx(file_path)
-            elif ext == '.txt':
-                self.analyze_text(file_path)
-            elif ext in ['.jpg', '.jpeg', '.png']:
-                self.analyze_image(file_path)
-            elif ext == '.csv':
-                self.analyze_csv(file_path)
-            elif ext == '.xlsx':
-                self.analyze_excel(file_path)
-            else:
+        While monitoring, content extraction is handed to the worker pool and this returns
+        at once; results are classified and stored by the collector thread.
+        """
+        try:
+            # Type and model are checked first so unsupported files (temp, cache, log files)
+            # are neither hashed nor given a file_metadata row.
+            kind = file_analysis.analysis_type(file_path)
+            if kind is None:
+                ext = os.path.splitext(file_path)[1].lower()
                 self.logger.log_warning(f"Unsupported file type skipped: {file_path} (Extension: {ext})")
+                return
+            if not self._model_ready(kind, file_path):
+                return
 
+            file_hash = self.hash_file(file_path)
             with self.hash_lock:
-                self.processed_hashes.add(file_hash)
+                processed = bool(file_hash) and file_hash in self.processed_hashes
+                skip = not file_hash or processed or file_hash in self._in_flight
+                if not skip:
+                    self._in_flight.add(file_hash)
+            if skip:
+                # Same content already analysed, possibly under another path: share its analysis.
+                if processed:
+                    self.memory.copy_file_analysis(file_path, file_hash)
+                self.logger.log_file(f"File already processed: {file_path}", "Skipped")
+                return
+
+            try:
+                if self.analysis_pool is not None:
+                    self._dispatch(file_path, file_hash, kind)
+                else:
+                    self._analyze(file_path, kind,
+                                  done=lambda success: self._finish_processing(file_path, file_hash, success))
+            except Exception:
+                with self.hash_lock:
+                    self._in_flight.discard(file_hash)
+                raise
         except Exception as e:
             self.logger.log_error(f"Error processing file: {file_path}, {e}")
 
+    def _finish_processing(self, file_path, file_hash, success=True):
+        """Record a finished file. Failed analyses are not marked processed, so a later event retries them."""
+        if success:
+            self.memory.mark_file_processed(file_path, file_hash)
+        with self.hash_lock:
+            if success:
+                self.processed_hashes.add(file_hash)
+            self._in_flight.discard(file_hash)
+
+    def _dispatch(self, file_path, file_hash, kind):
+        """Send a file to the worker pool, or park it if its type is at its concurrency limit."""
+        with self._analysis_lock:
+            self._pending += 1
+            if self._running.get(kind, 0) >= self.type_limits.get(kind, 1):
+                self._waiting.setdefault(kind, deque()).append((file_path, file_hash))
+                return
+            self._running[kind] = self._running.get(kind, 0) + 1
+        self._submit(file_path, file_hash, kind)
+
+    def _submit(self, file_path, file_hash, kind, attempt=1):
+        pool = self.analysis_pool
+        try:
+            future = pool.submit(file_analysis.extract, file_path, kind)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(
+            lambda done: self._analysis_results.put((file_path, file_hash, kind, attempt, pool, done))
+        )
+
+    def _new_analysis_pool(self):
+        # Spawned, not forked: forking a process with TensorFlow loaded and the observer and
+        # batcher threads running can deadlock the child.
+        return ProcessPoolExecutor(max_workers=self.analysis_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_broken_pool(self, broken_pool):
+        """Swap in a fresh worker pool after a worker process died, unless that already happened."""
+        with self._analysis_lock:
+            if self.analysis_pool is not broken_pool:
+                return
+            self.analysis_pool = self._new_analysis_pool()
+        broken_pool.shutdown(wait=False)
+        self.logger.log_warning("An analysis worker process died; restarted the worker pool.")
+
+    def _release_slot(self, kind):
+        """Hand a finished file's slot to the next waiting file of the same type."""
+        with self._analysis_lock:
+            waiting = self._waiting.get(kind)
+            next_file = waiting.popleft() if waiting else None
+            if next_file is None:
+                self._running[kind] -= 1
+        if next_file is not None:
+            self._submit(*next_file, kind)
+
+    def _collect_analyses(self):
+        """Store worker results from the main process and hand freed slots to waiting files."""
+        while True:
+            item = self._analysis_results.get()
+            if item is None:
+                return
+            file_path, file_hash, kind, attempt, pool, future = item
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # Every file in flight fails when one worker dies, so each is retried once on a
+                # new pool; the file that keeps killing workers runs out of attempts.
+                self._replace_broken_pool(pool)
+                if attempt < ANALYSIS_ATTEMPTS:
+                    self._submit(file_path, file_hash, kind, attempt + 1)
+                    continue
+                self._release_slot(kind)
+                self.logger.log_error(f"Error analyzing {kind} file: {file_path}, {e}")
+                self._analysis_done(file_path, file_hash, False)
+                continue
+            except Exception as e:
+                self._release_slot(kind)
+                self.logger.log_error(f"Error analyzing {kind} file: {file_path}, {e}")
+                self._analysis_done(file_path, file_hash, False)
+                continue
+            self._release_slot(kind)
+            self._complete_analysis(file_path, kind, result,
+                                    done=lambda success, file_path=file_path, file_hash=file_hash:
+                                    self._analysis_done(file_path, file_hash, success))
+
+    def _analysis_done(self, file_path, file_hash, success):
+        try:
+            self._finish_processing(file_path, file_hash, success)
+        except Exception as e:
+            self.logger.log_error(f"Error recording processed file: {file_path}, {e}")
+        with self._analysis_lock:
+            self._pending -= 1
+            self._analysis_lock.notify_all()
+
     def start_monitoring(self):
         if not os.path.exists(self.scan_dir):
             self.logger.log_error(f"Directory {self.scan_dir} does not exist.")
             return
+        self.analysis_pool = self._new_analysis_pool()
+        if self.text_model:
+            self.text_batcher = PredictionBatcher(self.text_model, list,
+                                                  self.predict_batch_size, self.predict_delay)
+        if self.image_model:
+            self.image_batcher = PredictionBatcher(self.image_model, np.stack,
+                                                   self.predict_batch_size, self.predict_delay)
+        self._analysis_collector = threading.Thread(target=self._collect_analyses, daemon=True)
+        self._analysis_collector.start()
         event_handler = FileEventHandler(self.logger, self.priority_queue)
         self.observer.schedule(event_handler, self.scan_dir, recursive=True)
         self.observer.start()
@@ -308,9 +774,14 @@ class FileManager:
         try:
             while not self.stop_event.is_set():
                 try:
-                    _, file_path = self.priority_queue.get(timeout=self.scan_interval)
-                    if os.path.exists(file_path):
+                    priority, file_path = self.priority_queue.get(timeout=self.scan_interval)
+                    if not os.path.exists(file_path):
+                        continue
+                    if self.should_process_file(file_path):
                         self.process_file(file_path)
+                    else:
+                        # Still cooling down from the last run: put it back rather than lose the edit.
+                        self.priority_queue.put((priority, file_path))
                 except queue.Empty:
                     continue
         except Exception as e:
@@ -319,10 +790,22 @@ class FileManager:
     def stop_monitoring(self):
         self.stop_event.set()
         self.logger.log_file("Draining remaining files before shutdown.")
-        while not self.priority_queue.empty():
-            _, file_path = self.priority_queue.get()
+        for _, file_path in self.priority_queue.drain():
             if os.path.exists(file_path):
                 self.process_file(file_path)
-        self.observer.stop()
-        self.observer.join()
+        with self._analysis_lock:
+            while self._pending:
+                self._analysis_lock.wait()
+        if self.analysis_pool is not None:
+            self.analysis_pool.shutdown()
+            self._analysis_results.put(None)
+            self._analysis_collector.join()
+            self.analysis_pool = None
+        for batcher in (self.text_batcher, self.image_batcher):
+            if batcher is not None:
+                batcher.close()
+        self.text_batcher = self.image_batcher = None
+        if self.observer.is_alive():
+            self.observer.stop()
+            self.observer.join()
         self.logger.log_file("Monitoring stopped.")
@@ -30,6 +30,11 @@ def update_database_schema(db_path):
             cursor.execute("ALTER TABLE file_metadata ADD COLUMN checksum TEXT")
             print("Added 'checksum' column to file_metadata.")
 
+        # Add analysis_result column if it doesn't exist
+        if "analysis_result" not in columns:
+            cursor.execute("ALTER TABLE file_metadata ADD COLUMN analysis_result TEXT")
+            print("Added 'analysis_result' column to file_metadata.")
+
         conn.commit()
         print("Database schema updated successfully.")
     except sqlite3.Error as e:
@@ -0,0 +1,185 @@
+"""Synthetic-scale benchmark for the Memory layer.
+
+Fills a throwaway database with generated interactions and file metadata, then times
+the hot Memory operations and prints one JSON document with throughput and p50/p99
+latency per operation. Run it before and after schema or index changes:
+
+    python -m Snowball.scripts.benchmark_memory --interactions 1000000 --files 5000000 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from Snowball.core.ai.memory import Memory, INSERT_INTERACTION
+
+WORDS = [
+    "report", "invoice", "photo", "budget", "notes", "resume", "project", "backup", "draft", "summary",
+    "meeting", "travel", "recipe", "contract", "design", "music", "video", "scan", "letter", "plan",
+]
+QUERY_TYPES = ["General", "Weather", "Math", "Search", "Reminder", "system_message"]
+EXTENSIONS = [".txt", ".pdf", ".docx", ".jpg", ".png", ".csv", ".xlsx"]
+TAGS = ["work", "personal", "finance", "family", "archive", "school", "travel", "health", "music", "code"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, ops=None):
+    """Throughput and latency percentiles (ms) for a list of per-call durations in seconds."""
+    total = sum(latencies)
+    ops = ops if ops is not None else len(latencies)
+    return {
+        "calls": len(latencies),
+        "ops": ops,
+        "ops_per_sec": ops / total if total else None,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def seed_interactions(memory, count, rng, old_fraction, batch_size=10000):
+    """Insert count interactions spread over the last 90 days; old_fraction of them are older than 30."""
+    now = datetime.utcnow()
+    # Seeding goes straight to executemany; store_interaction is benchmarked separately below.
+    for start in range(0, count, batch_size):
+        rows = []
+        for i in range(start, min(count, start + batch_size)):
+            days_ago = rng.uniform(31, 90) if rng.random() < old_fraction else rng.uniform(0, 29)
+            timestamp = (now - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+            rows.append((f"question {i} about {rng.choice(WORDS)}", f"answer {i} " + " ".join(rng.choices(WORDS, k=12)),
+                         rng.choice(QUERY_TYPES), timestamp, None, None))
+        with memory._get_cursor() as cursor:
+            cursor.executemany(INSERT_INTERACTION, rows)
+
+
+def file_rows(start, count, rng):
+    for i in range(start, start + count):
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}{rng.choice(EXTENSIONS)}"
+        tags = ",".join(rng.sample(TAGS, rng.randint(1, 3)))
+        yield (name, f"/bench/{i % 1000}/{name}", "2024-01-01 00:00:00", rng.randint(1, 10 ** 9), tags)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="snowball_bench_")
+    memory = Memory(db_path=os.path.join(work_dir, "memories.db"), slow_query_ms=float("inf"))
+    results = {
+        "config": vars(args),
+        "started": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "operations": {},
+    }
+    ops = results["operations"]
+    try:
+        start = time.perf_counter()
+        seed_interactions(memory, args.interactions, rng, args.old_fraction)
+        results["seed_interactions_sec"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        memory.store_file_metadata_many(file_rows(0, args.files, rng), batch_size=args.batch_size)
+        results["seed_files_sec"] = time.perf_counter() - start
+
+        ops["store_interaction"] = summarize([
+            timed(memory.store_interaction, f"bench input {i}", f"bench response {i}", rng.choice(QUERY_TYPES))
+            for i in range(args.iterations)
+        ])
+
+        next_file = args.files
+        single = []
+        for name, path, modified, size, tags in file_rows(next_file, args.iterations, rng):
+            single.append(timed(memory.store_file_metadata, name, path, modified, size, tags))
+        ops["store_file_metadata"] = summarize(single)
+        next_file += args.iterations
+
+        batches = []
+        for _ in range(max(1, args.iterations // 10)):
+            batches.append(timed(memory.store_file_metadata_many, list(file_rows(next_file, args.batch_size, rng)),
+                                 batch_size=args.batch_size))
+            next_file += args.batch_size
+        ops["store_file_metadata_many"] = summarize(batches, ops=len(batches) * args.batch_size)
+
+        # Clear the query cache first so every call measures the database, not a cache hit.
+        searches = []
+        for _ in range(args.iterations):
+            memory.metadata_cache.clear()
+            searches.append(timed(memory.search_files, f"{rng.choice(WORDS)} {rng.choice(WORDS)}", limit=50))
+        ops["search_files"] = summarize(searches)
+
+        for match in ("any", "all"):
+            tag_searches = []
+            for _ in range(args.iterations):
+                memory.metadata_cache.clear()
+                tag_searches.append(timed(memory.search_files_by_tags, rng.sample(TAGS, 2), match=match, limit=50))
+            ops[f"search_files_by_tags_{match}"] = summarize(tag_searches)
+
+        total = args.interactions + args.iterations
+        for depth in (0.5, 0.9, 0.99):
+            offset = int(total * depth)
+            ops[f"get_interactions_offset_{int(depth * 100)}pct"] = summarize([
+                timed(memory.get_interactions, limit=100, offset=offset) for _ in range(max(1, args.iterations // 10))
+            ])
+
+        start = time.perf_counter()
+        archived = memory.archive_old_interactions(days=30, chunk_size=args.batch_size, pause=0)
+        elapsed = time.perf_counter() - start
+        ops["archive_old_interactions"] = {
+            "rows": archived,
+            "seconds": elapsed,
+            "rows_per_sec": archived / elapsed if elapsed else None,
+        }
+
+        results["memory_stats"] = {
+            key: value for key, value in memory.stats().items() if key not in ("recent_slow_queries",)
+        }
+        results["db_size_bytes"] = sum(
+            os.path.getsize(os.path.join(work_dir, name)) for name in os.listdir(work_dir)
+            if os.path.isfile(os.path.join(work_dir, name))
+        )
+    finally:
+        memory.close()
+        if args.keep:
+            results["work_dir"] = work_dir
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Snowball Memory layer on synthetic data.")
+    parser.add_argument("--interactions", type=int, default=1000000, help="Interactions to seed.")
+    parser.add_argument("--files", type=int, default=5000000, help="file_metadata rows to seed.")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per operation.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk write and archive chunk.")
+    parser.add_argument("--old-fraction", type=float, default=0.5, help="Share of interactions older than 30 days.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic data.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary database for inspection.")
+    args = parser.parse_args()
+
+    results = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(results)
+    else:
+        print(results)
+
+
+if __name__ == "__main__":
+    main()